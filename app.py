@@ -1,10 +1,8 @@
 import streamlit as st
-from sklearn.linear_model import LogisticRegression
-from database import (
-    init_db,
-    register_user_db,
-    authenticate_user_db
-)
+from database import init_db
+from auth import register_user, login, start_session, end_session, verify_token
+from ml_model import warm_up
+from metrics import start_exporters
 
 # 🔥 MUST BE FIRST STREAMLIT COMMAND
 st.set_page_config(page_title="Artha AI", layout="wide")
@@ -15,6 +13,18 @@ from styles.login_bg import load_login_background
 # ---------------- DATABASE INIT ----------------
 init_db()   # ✅ This now creates both users & transactions tables
 
+# ---------------- MODEL WARM-UP ----------------
+warm_up()   # once per process, in the background
+
+# ---------------- METRICS EXPORT ----------------
+start_exporters()   # Prometheus / JSONL, only if configured
+
+# ---------------- SESSION CHECK ----------------
+# An expired or tampered session token sends the user back to login
+if st.session_state.get("page") == "dashboard" and \
+        verify_token(st.session_state.get("session_token")) is None:
+    end_session()
+
 # ---------------- SESSION INIT ----------------
 if "authenticated" not in st.session_state:
     st.session_state.authenticated = False
@@ -80,9 +90,14 @@ if st.session_state.page == "login":
             password = st.text_input("Password", type="password", key="login_pass")
 
             if st.button("Login"):
-                if authenticate_user_db(username, password):
-                    st.session_state.authenticated = True
-                    st.session_state.username = username.lower().strip()  # ✅ lowercase fix
+                try:
+                    token = login(username, password)
+                except TimeoutError:
+                    st.error("Too many logins right now. Please try again.")
+                    st.stop()
+
+                if token is not None:
+                    start_session(token)   # ✅ signed token, lowercase username
                     st.session_state.page = "dashboard"
                     st.rerun()
                 else:
@@ -94,7 +109,13 @@ if st.session_state.page == "login":
             new_pass = st.text_input("New Password", type="password", key="signup_pass")
 
             if st.button("Register"):
-                if register_user_db(new_user, new_pass):
+                try:
+                    registered = register_user(new_user, new_pass)
+                except TimeoutError:
+                    st.error("Too many sign-ups right now. Please try again.")
+                    st.stop()
+
+                if registered:
                     st.success("User registered successfully. Please login.")
                 else:
                     st.error("Username already exists.")
@@ -107,7 +128,7 @@ elif st.session_state.page == "dashboard":
     st.sidebar.success(f"Logged in as {st.session_state.username}")
 
     if st.sidebar.button("Logout"):
-        st.session_state.clear()   # ✅ clean logout
+        end_session()   # ✅ clean logout
         st.rerun()
 
     st.divider()
@@ -1,18 +1,207 @@
+import os
+import hmac
+import time
+import base64
 import hashlib
+import secrets
+import threading
+from collections import OrderedDict
 
-# In-memory user store (for now)
-users_db = {}
+import streamlit as st
 
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+from database import (
+    init_db,
+    register_user_db,
+    authenticate_user_db,
+    get_user_record,
+    get_user_stats,
+    get_transaction_summary,
+    get_transaction_series,
+    add_write_listener
+)
+from feature_store import get_feature_store
 
+# ---------------- SESSION SETTINGS ----------------
+# ARTHA_SESSION_SECRET=<text> keeps tokens valid across restarts and
+# processes; otherwise each process signs with its own random key.
+SESSION_SECRET = (
+    os.environ.get("ARTHA_SESSION_SECRET") or secrets.token_hex(32)
+).encode()
+SESSION_TTL_SECONDS = 8 * 3600
+
+USER_CACHE_TTL = 300          # seconds a user record is reused
+SUMMARY_CACHE_TTL = 60        # seconds stats/summaries are reused without writes
+CACHE_SIZE = 4096             # entries per cache (LRU)
+
+
+# ---------------- SESSION TOKENS ----------------
+# <base64 username>.<expiry unix time>.<HMAC-SHA256 of the first two>
+def _sign(payload):
+    return hmac.new(SESSION_SECRET, payload.encode(), hashlib.sha256).hexdigest()
+
+
+def issue_token(username, ttl=SESSION_TTL_SECONDS):
+    name = base64.urlsafe_b64encode(username.encode()).decode()
+    payload = f"{name}.{int(time.time() + ttl)}"
+    return f"{payload}.{_sign(payload)}"
+
+
+def verify_token(token):
+    # Username for a well-signed, unexpired token, else None. No DB access.
+    try:
+        name, expiry, signature = token.split(".")
+        if not hmac.compare_digest(signature, _sign(f"{name}.{expiry}")):
+            return None
+        if int(expiry) < time.time():
+            return None
+        return base64.urlsafe_b64decode(name.encode()).decode()
+    except (AttributeError, ValueError, UnicodeDecodeError):
+        return None
+
+
+# ---------------- TTL CACHE ----------------
+class TTLCache:
+    # LRU with per-entry expiry. Keys start with the username, so all of a
+    # user's entries can be dropped at once. A load that raced with an
+    # invalidation is returned but not stored, so it can't resurrect stale
+    # data.
+
+    def __init__(self, ttl, max_size=CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, load):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generations.get(key[0], 0)
+
+        value = load()
+
+        with self._lock:
+            if self._generations.get(key[0], 0) == generation:
+                self._entries[key] = (now + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, username):
+        with self._lock:
+            self._generations[username] = self._generations.get(username, 0) + 1
+            for key in [k for k in self._entries if k[0] == username]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+user_cache = TTLCache(USER_CACHE_TTL)
+summary_cache = TTLCache(SUMMARY_CACHE_TTL)
+
+
+def invalidate_user(username):
+    summary_cache.invalidate(username)
+
+
+def _transactions_written(usernames):
+    for username in usernames:
+        summary_cache.invalidate(username)
+
+
+# Every committed insert (direct, bulk or group-committed) drops the
+# affected users' cached summaries. Group-committed callers are told first,
+# so a session reading its own write right away calls invalidate_user too.
+add_write_listener(_transactions_written)
+
+
+# ---------------- CACHED READS ----------------
+def get_user(username):
+    return user_cache.get((username, "user"), lambda: get_user_record(username))
+
+
+def user_stats(username, exclude_last=False):
+    return summary_cache.get(
+        (username, "stats", exclude_last),
+        lambda: get_user_stats(username, exclude_last=exclude_last)
+    )
+
+
+def recent_transactions(username, limit=10):
+    # Shared between sessions: treat the frame as read-only
+    return summary_cache.get(
+        (username, "recent", limit),
+        lambda: get_feature_store().user_features(username, limit=limit)
+    )
+
+
+def transaction_summary(username, range_key, start=None):
+    # range_key names the window (e.g. "Last 7 days"); a cached summary
+    # may trail the window's moving start by up to SUMMARY_CACHE_TTL
+    return summary_cache.get(
+        (username, "summary", range_key),
+        lambda: get_transaction_summary(username, start=start)
+    )
+
+
+def transaction_series(username, range_key, start=None, bucket="day"):
+    return summary_cache.get(
+        (username, "series", range_key, bucket),
+        lambda: get_transaction_series(username, start=start, bucket=bucket)
+    )
+
+
+# ---------------- LOGIN / SIGN UP ----------------
 def register_user(username, password):
-    if username in users_db:
+    username = username.lower().strip()
+    if not register_user_db(username, password):
         return False
-    users_db[username] = hash_password(password)
+    user_cache.invalidate(username)
     return True
 
-def authenticate_user(username, password):
-    if username not in users_db:
-        return False
-    return users_db[username] == hash_password(password)
\ No newline at end of file
+
+def login(username, password):
+    # Session token on success, else None
+    username = username.lower().strip()
+    if not authenticate_user_db(username, password):
+        return None
+    user_cache.invalidate(username)
+    return issue_token(username)
+
+
+def start_session(token):
+    username = verify_token(token)
+    st.session_state.session_token = token
+    st.session_state.authenticated = True
+    st.session_state.username = username
+
+
+def end_session():
+    st.session_state.clear()
+
+
+def require_login(message="Please login first."):
+    # Username of the signed-in session, or warns and stops the page.
+    # Token check is CPU only; the user record comes from the cache.
+    init_db()
+    username = verify_token(st.session_state.get("session_token"))
+    if username is None or get_user(username) is None:
+        for key in ("session_token", "authenticated", "username"):
+            st.session_state.pop(key, None)
+        st.warning(message)
+        st.stop()
+
+    st.session_state.authenticated = True
+    st.session_state.username = username
+    return username
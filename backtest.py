@@ -0,0 +1,217 @@
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression, Ridge
+
+# ---------------- BACKTEST SETTINGS ----------------
+TRAIN_SIZE = 60               # bars in the first training window
+STEP = 5                      # bars predicted between refits
+LAGS = 3                      # lagged closes used as features
+VOL_WINDOW = 5                # same rolling window as the Prediction Lab
+
+
+# ---------------- FEATURES ----------------
+def build_features(close, lags=LAGS, vol_window=VOL_WINDOW):
+    # Vectorised feature matrix for next-close prediction. Column 0 is
+    # always today's close so models can use it as the "Close" feature.
+    close = pd.Series(np.asarray(close, dtype=float))
+    ret = close.pct_change()
+
+    features = pd.DataFrame({
+        "Close": close,
+        "Return": ret,
+        "Volatility": ret.rolling(vol_window).std(),
+    })
+    for lag in range(1, lags + 1):
+        features[f"Close_lag{lag}"] = close.shift(lag)
+
+    target = close.shift(-1)
+    valid = features.notna().all(axis=1) & target.notna()
+
+    return features[valid].to_numpy(), target[valid].to_numpy(), list(features.columns)
+
+
+# ---------------- MODELS ----------------
+class LastCloseModel:
+    # Naive baseline: tomorrow's close equals today's
+
+    def fit(self, X, y):
+        return self
+
+    def predict(self, X):
+        return X[:, 0]
+
+
+class ColumnModel:
+    # Fits the wrapped model on a subset of feature columns
+
+    def __init__(self, model, columns):
+        self.model = model
+        self.columns = columns
+
+    def fit(self, X, y):
+        self.model.fit(X[:, self.columns], y)
+        return self
+
+    def predict(self, X):
+        return self.model.predict(X[:, self.columns])
+
+
+MODELS = {
+    "naive": lambda: LastCloseModel(),
+    # What the AI Prediction Lab page fits: Close -> Next_Close
+    "linear_close": lambda: ColumnModel(LinearRegression(), [0]),
+    "linear_features": lambda: LinearRegression(),
+    "ridge_features": lambda: Ridge(alpha=1.0),
+}
+
+
+# ---------------- WALK-FORWARD ----------------
+def walk_forward(X, y, model_name, train_size=TRAIN_SIZE, step=STEP,
+                 expanding=True):
+    # Refit every `step` bars on data strictly before the bars predicted.
+    # Returns (predictions with NaN for the warm-up, timings dict).
+    n = len(y)
+    predictions = np.full(n, np.nan)
+    fit_seconds = predict_seconds = 0.0
+    fits = 0
+
+    for start in range(train_size, n, step):
+        lo = 0 if expanding else start - train_size
+        end = min(start + step, n)
+
+        model = MODELS[model_name]()
+        t0 = time.perf_counter()
+        model.fit(X[lo:start], y[lo:start])
+        t1 = time.perf_counter()
+        predictions[start:end] = model.predict(X[start:end])
+        t2 = time.perf_counter()
+
+        fit_seconds += t1 - t0
+        predict_seconds += t2 - t1
+        fits += 1
+
+    return predictions, {
+        "fits": fits,
+        "fit_seconds": fit_seconds,
+        "predict_seconds": predict_seconds,
+    }
+
+
+def error_metrics(X, y, predictions):
+    mask = ~np.isnan(predictions)
+    if not mask.any():
+        return {"n": 0}
+
+    actual, predicted, close = y[mask], predictions[mask], X[mask, 0]
+    error = predicted - actual
+
+    return {
+        "n": int(mask.sum()),
+        "mae": float(np.mean(np.abs(error))),
+        "rmse": float(np.sqrt(np.mean(error ** 2))),
+        "mape": float(np.mean(np.abs(error / actual))) * 100,
+        "direction_accuracy": float(
+            np.mean(np.sign(predicted - close) == np.sign(actual - close))
+        ) * 100,
+    }
+
+
+def backtest_symbol(symbol, close, model_names, train_size=TRAIN_SIZE,
+                    step=STEP, expanding=True):
+    # One symbol, several models. Top-level so it can run in a worker.
+    X, y, _ = build_features(close)
+    rows = []
+
+    for name in model_names:
+        predictions, timing = walk_forward(X, y, name, train_size, step, expanding)
+        metrics = error_metrics(X, y, predictions)
+        n = metrics["n"]
+
+        rows.append({
+            "symbol": symbol,
+            "model": name,
+            **metrics,
+            "fits": timing["fits"],
+            "fits_per_sec": timing["fits"] / timing["fit_seconds"] if timing["fit_seconds"] else float("nan"),
+            "predictions_per_sec": n / timing["predict_seconds"] if timing["predict_seconds"] else float("nan"),
+            "fit_seconds": timing["fit_seconds"],
+            "predict_seconds": timing["predict_seconds"],
+        })
+
+    return rows
+
+
+def run_backtest(closes_by_symbol, model_names=tuple(MODELS), train_size=TRAIN_SIZE,
+                 step=STEP, expanding=True, scheduler=None):
+    # closes_by_symbol: {symbol: close prices}. With a scheduler, each
+    # symbol runs in its own training worker. Returns a report DataFrame.
+    model_names = list(model_names)
+    started = time.perf_counter()
+
+    if scheduler is None:
+        results = [
+            backtest_symbol(symbol, close, model_names, train_size, step, expanding)
+            for symbol, close in closes_by_symbol.items()
+        ]
+    else:
+        futures = [
+            scheduler.submit(
+                ("backtest", symbol, tuple(model_names), train_size, step, expanding),
+                backtest_symbol,
+                symbol, np.asarray(close, dtype=float), model_names,
+                train_size, step, expanding
+            )
+            for symbol, close in closes_by_symbol.items()
+        ]
+        results = [f.result() for f in futures]
+
+    report = pd.DataFrame([row for rows in results for row in rows])
+    report.attrs["wall_seconds"] = time.perf_counter() - started
+    return report
+
+
+# ---------------- COMMAND LINE ----------------
+if __name__ == "__main__":
+    import argparse
+
+    # Import by module name so worker processes can unpickle the jobs
+    import backtest
+    from market_data import get_store
+    from training import get_scheduler
+
+    parser = argparse.ArgumentParser(description="Walk-forward backtest of price models")
+    parser.add_argument("--symbols", nargs="+", default=["^NSEI", "^BSESN", "RELIANCE.NS"])
+    parser.add_argument("--period", default="5y")
+    parser.add_argument("--interval", default="1d")
+    parser.add_argument("--models", nargs="+", default=list(MODELS), choices=list(MODELS))
+    parser.add_argument("--train-size", type=int, default=TRAIN_SIZE)
+    parser.add_argument("--step", type=int, default=STEP)
+    parser.add_argument("--rolling", action="store_true", help="fixed-size instead of expanding window")
+    parser.add_argument("--serial", action="store_true", help="don't use the process pool")
+    parser.add_argument("--out", help="write the report to this CSV file")
+    args = parser.parse_args()
+
+    store = get_store()
+    closes = {}
+    for symbol in args.symbols:
+        bars = store.get_bars(symbol, args.interval, args.period)
+        if len(bars) > args.train_size + 1:
+            closes[symbol] = bars["Close"].to_numpy()
+
+    report = backtest.run_backtest(
+        closes,
+        args.models,
+        train_size=args.train_size,
+        step=args.step,
+        expanding=not args.rolling,
+        scheduler=None if args.serial else get_scheduler()
+    )
+
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(report.round(4).to_string(index=False))
+    print(f"\n{len(closes)} symbols in {report.attrs['wall_seconds']:.2f}s")
+
+    if args.out:
+        report.to_csv(args.out, index=False)
@@ -0,0 +1,379 @@
+import os
+import sys
+import time
+import queue
+import shutil
+import logging
+import importlib
+import threading
+import multiprocessing
+from collections import Counter as Tally
+
+import numpy as np
+from streamlit.testing.v1 import AppTest
+
+from metrics import Histogram, histogram_state, merge_histograms
+
+# ---------------- LOAD TEST SETTINGS ----------------
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRATCH_DIR = os.path.join(REPO_DIR, "benchmarks", "scratch", "loadtest")
+
+APP = os.path.join(REPO_DIR, "app.py")
+PAGES = {
+    "qr": os.path.join(REPO_DIR, "pages", "1_QR_Generator.py"),
+    "risk": os.path.join(REPO_DIR, "pages", "2_Risk_Intelligence.py"),
+    "analytics": os.path.join(REPO_DIR, "pages", "3_Analytics_Dashboard.py"),
+    "market": os.path.join(REPO_DIR, "pages", "4_Live_Market_Simulation.py"),
+    "prediction": os.path.join(REPO_DIR, "pages", "5_AI_Prediction.py"),
+}
+
+DEFAULT_SESSIONS = 8
+DEFAULT_ITERATIONS = 5        # QR + page views per session after login
+DEFAULT_VIEWS = ("risk", "analytics", "market")
+DEFAULT_HISTORY = 50          # stored transactions per user before the run
+SCRIPT_TIMEOUT = 120          # seconds per script run before it counts as failed
+READY_TIMEOUT = 600           # seconds for all session processes to start
+PASSWORD = "load-test-password"
+
+# Error messages folded into one category each, whatever the details
+ERROR_KINDS = (
+    ("database is locked", "database_locked"),
+    ("database table is locked", "database_locked"),
+    ("timed out", "timeout"),
+    ("Timeout", "timeout"),
+)
+
+
+# ---------------- RESULTS ----------------
+class LoadResults:
+    # Per-step latency and outcome across all sessions
+
+    def __init__(self):
+        self.latency = {}
+        self.outcomes = {}
+        self.errors = Tally()
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, step, seconds, outcome, message=None):
+        with self._lock:
+            hist = self.latency.get(step)
+            if hist is None:
+                hist = self.latency[step] = Histogram(step)
+                self.outcomes[step] = Tally()
+            self.outcomes[step][outcome] += 1
+            if outcome == "error":
+                kind = error_kind(message)
+                self.errors[kind] += 1
+                self.samples.setdefault(kind, message)
+        hist.observe(seconds)
+
+    def report(self, wall_seconds):
+        steps = {}
+        for step, hist in self.latency.items():
+            result = hist.summary()
+            result.update(self.outcomes[step])
+            result["error_rate"] = self.outcomes[step]["error"] / result["count"]
+            steps[step] = result
+
+        total = sum(r["count"] for r in steps.values())
+        failed = sum(self.errors.values())
+        return {
+            "wall_seconds": wall_seconds,
+            "requests": total,
+            "requests_per_sec": total / wall_seconds if wall_seconds else 0.0,
+            "errors": failed,
+            "error_rate": failed / total if total else 0.0,
+            "error_kinds": dict(self.errors),
+            "error_samples": self.samples,
+            "steps": steps,
+        }
+
+
+def error_kind(message):
+    message = message or ""
+    for needle, kind in ERROR_KINDS:
+        if needle in message:
+            return kind
+    return message.splitlines()[0][:80] if message else "unknown"
+
+
+# ---------------- VIRTUAL USERS ----------------
+class VirtualUser:
+    # One browser session: signs up, logs in through app.py, then
+    # alternates generating a QR with viewing the other pages. Each step
+    # is a full script run in its own AppTest, like a page load.
+    # Records (step, started_at, seconds, outcome, message) tuples.
+
+    def __init__(self, number, views, seed=0):
+        self.username = f"load{number:04d}"
+        self.views = views
+        self.records = []
+        self.rng = np.random.default_rng(seed + number)
+        self.median = float(self.rng.lognormal(np.log(800), 0.5))
+        self.session = None
+
+    def run(self, iterations):
+        if not self.step("signup", self.signup) or not self.step("login", self.login):
+            return
+        for _ in range(iterations):
+            self.step("qr", self.generate_qr)
+            for view in self.views:
+                self.step(view, lambda: self.view(PAGES[view]))
+
+    def step(self, name, action):
+        started_at, started = time.time(), time.perf_counter()
+        try:
+            outcome, message = action()
+        except Exception as e:
+            outcome, message = "error", f"{type(e).__name__}: {e}"
+        self.records.append(
+            (name, started_at, time.perf_counter() - started, outcome, message)
+        )
+        return outcome != "error"
+
+    # ----- steps -----
+    def signup(self):
+        at = self._script(APP)
+        at.text_input(key="signup_user").input(self.username)
+        at.text_input(key="signup_pass").input(PASSWORD)
+        self._button(at, "Register").click().run()
+        # Reruns of a load test find their users already registered
+        return self._outcome(at)
+
+    def login(self):
+        at = self._script(APP)
+        at.text_input(key="login_user").input(self.username)
+        at.text_input(key="login_pass").input(PASSWORD)
+        self._button(at, "Login").click().run()
+
+        outcome, message = self._outcome(at)
+        if outcome == "ok" and not at.session_state["authenticated"]:
+            return "error", "login rejected"
+        self.session = {"session_token": at.session_state["session_token"]}
+        return outcome, message
+
+    def generate_qr(self):
+        amount = max(1.0, round(float(self.rng.lognormal(np.log(self.median), 0.6)), 2))
+        at = self._script(PAGES["qr"], self.session)
+        at.number_input[0].set_value(amount)
+        self._button(at, "Generate Secure QR").click().run(timeout=SCRIPT_TIMEOUT)
+
+        outcome, message = self._outcome(at)
+        if outcome == "ok" and any("Database Error" in e.value for e in at.error):
+            return "error", next(e.value for e in at.error if "Database Error" in e.value)
+        if outcome == "ok" and any("High Risk" in e.value for e in at.error):
+            return "blocked", None
+        return outcome, message
+
+    def view(self, path):
+        return self._outcome(self._script(path, self.session))
+
+    # ----- internals -----
+    def _script(self, path, session=None):
+        at = AppTest.from_file(path, default_timeout=SCRIPT_TIMEOUT)
+        for key, value in (session or {}).items():
+            at.session_state[key] = value
+        return at.run()
+
+    def _button(self, at, label):
+        return next(b for b in at.button if b.label == label)
+
+    def _outcome(self, at):
+        if at.exception:
+            return "error", at.exception[0].message
+        return "ok", None
+
+
+# ---------------- SETUP ----------------
+def prepare(scratch_dir, replay_dir, fresh):
+    # Runs the app inside scratch_dir: fintech.db, market_data.db and
+    # model_cache are relative paths, so nothing touches the real ones.
+    # Must run before any app module is imported (market data settings
+    # are read at import).
+    if replay_dir is not None:
+        replay_dir = os.path.abspath(replay_dir)
+    if fresh:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+    os.makedirs(scratch_dir, exist_ok=True)
+    os.chdir(scratch_dir)
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+
+    from benchmarks import workloads
+
+    if replay_dir is None:
+        replay_dir = workloads.write_replay(os.path.join(scratch_dir, "replay"))
+    os.environ["ARTHA_MARKET_REPLAY_DIR"] = replay_dir
+
+
+def seed_history(sessions, history, seed=0):
+    # Stored transactions per user, so risk scoring fits real models
+    import database
+    from benchmarks import workloads
+
+    database.init_db()
+    rng = np.random.default_rng(seed)
+    rows = []
+    for number in range(sessions):
+        username = f"load{number:04d}"
+        median = float(np.random.default_rng(seed + number).lognormal(np.log(800), 0.5))
+        rows.extend((username, a) for a in workloads.amounts(history, median, rng).tolist())
+    database.insert_transactions_bulk(rows)
+
+
+# ---------------- SESSION PROCESSES ----------------
+# AppTest swaps process-global Streamlit state (the Runtime singleton,
+# config options) for the length of a script run, so two runs can't
+# overlap in one process. Each session therefore gets its own process.
+# Unlike `streamlit run`, sessions then don't share pools, the group-commit
+# writer or model caches: SQLite sees cross-process lock contention, a
+# harsher case than one server process.
+PRELOAD = ("database", "ml_model", "risk_engine", "qr_service", "charts",
+           "market_data", "feature_store", "training")
+
+
+def _session_process(number, iterations, views, seed, ramp_seconds, sessions,
+                     ready, out):
+    # Streamlit's per-run deprecation notices would bury the report
+    logging.disable(logging.WARNING)
+    for module in PRELOAD:
+        importlib.import_module(module)
+
+    user = VirtualUser(number, views, seed)
+    try:
+        ready.wait(timeout=READY_TIMEOUT)
+    except threading.BrokenBarrierError:
+        return
+    time.sleep(ramp_seconds * number / sessions)
+    try:
+        user.run(iterations)
+    finally:
+        # A spawned process exits without running atexit hooks, and would
+        # wait forever on idle training workers
+        sys.modules["training"].get_scheduler().shutdown()
+        sys.modules["database"].stop_writers()
+    out.put((user.records, histogram_state()))
+
+
+def run_load(sessions, iterations, views, seed=0, ramp_seconds=0.0):
+    # Returns the report; app-side stage timers from every session are
+    # merged into this process's metrics registry
+    context = multiprocessing.get_context("spawn")
+    ready = context.Barrier(sessions + 1)
+    out = context.Queue()
+    processes = [
+        context.Process(
+            target=_session_process,
+            args=(n, iterations, views, seed, ramp_seconds, sessions, ready, out),
+            name=f"session-{n}"
+        )
+        for n in range(sessions)
+    ]
+    for process in processes:
+        process.start()
+
+    # Timing starts once every session has imported the app
+    ready.wait(timeout=READY_TIMEOUT)
+
+    finished = []
+    while len(finished) < sessions:
+        try:
+            finished.append(out.get(timeout=1))
+        except queue.Empty:
+            if not any(p.is_alive() for p in processes):
+                break
+    for process in processes:
+        process.join()
+
+    results = LoadResults()
+    for records, state in finished:
+        merge_histograms(state)
+        for name, _, seconds, outcome, message in records:
+            results.record(name, seconds, outcome, message)
+    for _ in range(sessions - len(finished)):
+        results.record("session", 0.0, "error", "session process crashed")
+
+    records = [r for records, _ in finished for r in records]
+    wall = (
+        max(started + seconds for _, started, seconds, _, _ in records)
+        - min(started for _, started, _, _, _ in records)
+    ) if records else 0.0
+    return results.report(wall)
+
+
+def print_report(report):
+    print(f"{'step':<12}{'count':>7}{'errors':>8}{'mean ms':>10}"
+          f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for step, r in report["steps"].items():
+        print(f"{step:<12}{r['count']:>7}{r.get('error', 0):>8}{r['mean_ms']:>10.1f}"
+              f"{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['max_ms']:>10.1f}")
+
+    print(f"\n{report['requests']} script runs in {report['wall_seconds']:.1f}s "
+          f"({report['requests_per_sec']:.2f}/s), "
+          f"{report['errors']} errors ({report['error_rate']:.1%})")
+    for kind, count in sorted(report["error_kinds"].items(), key=lambda kv: -kv[1]):
+        print(f"  {count:>5}  {kind}")
+
+
+# ---------------- COMMAND LINE ----------------
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Drive the Streamlit app with concurrent simulated sessions"
+    )
+    parser.add_argument("--sessions", type=int, default=DEFAULT_SESSIONS)
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument("--views", nargs="*", default=list(DEFAULT_VIEWS),
+                        choices=[p for p in PAGES if p != "qr"],
+                        help="pages viewed after each QR")
+    parser.add_argument("--history", type=int, default=DEFAULT_HISTORY,
+                        help="stored transactions per user before the run")
+    parser.add_argument("--ramp", type=float, default=0.0,
+                        help="seconds over which sessions start")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scratch", default=SCRATCH_DIR, help="working directory for databases")
+    parser.add_argument("--replay-dir", help="market CSVs (default: synthetic)")
+    parser.add_argument("--keep", action="store_true",
+                        help="reuse the scratch directory of a previous run")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+
+    prepare(os.path.abspath(args.scratch), args.replay_dir, fresh=not args.keep)
+
+    from metrics import snapshot, reset
+    from benchmarks.run import git_commit, save_results
+
+    if args.history and not args.keep:
+        seed_history(args.sessions, args.history, args.seed)
+    reset()
+
+    print(f"{args.sessions} sessions x {args.iterations} iterations "
+          f"(qr + {', '.join(args.views) or 'nothing'})...", file=sys.stderr)
+    report = run_load(args.sessions, args.iterations, args.views, args.seed, args.ramp)
+    print_report(report)
+
+    results = {
+        "meta": {
+            "timestamp": time.time(),
+            "commit": git_commit(),
+            "kind": "loadtest",
+            "sessions": args.sessions,
+            "iterations": args.iterations,
+            "views": args.views,
+            "history": args.history,
+            "cpus": os.cpu_count(),
+        },
+        "load": report,
+        # Stage timers recorded by the app itself during the run
+        "timers": snapshot()["timers"],
+    }
+    if not args.no_save:
+        print(f"\nsaved {save_results(results, prefix='loadtest-')}")
+
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
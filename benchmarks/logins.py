@@ -0,0 +1,106 @@
+import os
+import sys
+import time
+import hashlib
+
+from credentials import CredentialPool, hash_password, verify_password, SCHEME, current_params
+from metrics import Histogram
+
+# ---------------- LOGIN BENCHMARK SETTINGS ----------------
+# (scheme, params) pairs swept by default; the current setting is marked
+COSTS = (
+    ("scrypt", (2 ** 13, 8, 1)),
+    ("scrypt", (2 ** 14, 8, 1)),
+    ("scrypt", (2 ** 15, 8, 1)),
+    ("pbkdf2_sha256", (210_000,)),
+    ("pbkdf2_sha256", (600_000,)),
+)
+DEFAULT_LOGINS = 64           # verifications per (cost, workers) point
+PASSWORD = "correct horse battery staple"
+
+
+def serial_latency(encoded, logins):
+    hist = Histogram("verify")
+    for _ in range(logins):
+        started = time.perf_counter()
+        verify_password(PASSWORD, encoded)
+        hist.observe(time.perf_counter() - started)
+    return hist.summary()
+
+
+def pool_throughput(encoded, logins, workers):
+    # A login storm: every verification submitted at once
+    pool = CredentialPool(workers=workers, queue_size=logins)
+    try:
+        started = time.perf_counter()
+        futures = [pool.submit(verify_password, PASSWORD, encoded) for _ in range(logins)]
+        assert all(f.result() for f in futures)
+        seconds = time.perf_counter() - started
+    finally:
+        pool.shutdown()
+    return logins / seconds
+
+
+def run(costs, logins, worker_counts):
+    cores = os.cpu_count() or 1
+    rows = []
+    for scheme, params in costs:
+        if scheme == "scrypt" and not hasattr(hashlib, "scrypt"):
+            continue
+        encoded = hash_password(PASSWORD, scheme, params)
+        latency = serial_latency(encoded, max(8, logins // 4))
+        for workers in worker_counts:
+            per_sec = pool_throughput(encoded, logins, workers)
+            rows.append({
+                "scheme": scheme,
+                "params": list(params),
+                "current": (scheme, params) == (SCHEME, current_params()),
+                "workers": workers,
+                "p50_ms": latency["p50_ms"],
+                "p95_ms": latency["p95_ms"],
+                "logins_per_sec": per_sec,
+                "logins_per_sec_per_core": per_sec / min(workers, cores),
+            })
+    return rows
+
+
+def print_rows(rows):
+    print(f"{'scheme':<15}{'params':<18}{'workers':>8}{'p50 ms':>9}{'p95 ms':>9}"
+          f"{'logins/s':>10}{'per core':>10}")
+    for r in rows:
+        label = ",".join(map(str, r["params"])) + (" *" if r["current"] else "")
+        print(f"{r['scheme']:<15}{label:<18}{r['workers']:>8}{r['p50_ms']:>9.1f}"
+              f"{r['p95_ms']:>9.1f}{r['logins_per_sec']:>10.1f}"
+              f"{r['logins_per_sec_per_core']:>10.1f}")
+
+
+# ---------------- COMMAND LINE ----------------
+def main(argv=None):
+    import argparse
+
+    from benchmarks.run import git_commit, save_results
+
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Password verification throughput per cost setting")
+    parser.add_argument("--logins", type=int, default=DEFAULT_LOGINS)
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, max(1, cores // 2), cores}))
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+
+    rows = run(COSTS, args.logins, args.workers)
+    print_rows(rows)
+    print(f"\n{cores} cores; * = current setting")
+
+    if not args.no_save:
+        results = {
+            "meta": {"timestamp": time.time(), "commit": git_commit(),
+                     "kind": "logins", "logins": args.logins, "cpus": cores},
+            "costs": rows,
+        }
+        print(f"saved {save_results(results, prefix='logins-')}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
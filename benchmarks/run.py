@@ -0,0 +1,277 @@
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+
+import numpy as np
+
+import database
+from metrics import Histogram
+from ml_model import ModelRegistry, train_user_model, predict_user_risk
+from model_store import ModelStore
+from qr_service import QRService, render_png, upi_uri
+from risk_engine import RiskEngine
+
+from benchmarks import workloads
+
+# ---------------- BENCHMARK SETTINGS ----------------
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_DIR, "benchmarks", "results")
+
+DEFAULT_ROWS = 100_000
+DEFAULT_USERS = 1_000
+DEFAULT_OPS = 500             # timed calls per latency case
+DEFAULT_FITS = 20             # model fits (cold paths fit one model each)
+REGRESSION_THRESHOLD = 0.25   # p95 or throughput worse by more than this
+
+
+# ---------------- MEASUREMENT ----------------
+def measure(fn, calls):
+    # Runs fn(*args) for every args tuple; per-call latency percentiles
+    # from the same histogram the app's metrics use, plus throughput
+    hist = Histogram("bench")
+    started = time.perf_counter()
+    for args in calls:
+        t = time.perf_counter()
+        fn(*args)
+        hist.observe(time.perf_counter() - t)
+    seconds = time.perf_counter() - started
+
+    result = hist.summary()
+    result["seconds"] = seconds
+    result["ops_per_sec"] = result["count"] / seconds if seconds else 0.0
+    return result
+
+
+def measure_load(timings):
+    # Bulk load: one observation per chunk, throughput in rows/s
+    hist = Histogram("bench")
+    for _, seconds in timings:
+        hist.observe(seconds)
+
+    rows = sum(n for n, _ in timings)
+    seconds = sum(s for _, s in timings)
+    result = hist.summary()
+    result["seconds"] = seconds
+    result["ops_per_sec"] = rows / seconds if seconds else 0.0
+    result["rows"] = rows
+    return result
+
+
+# ---------------- CASES ----------------
+def run_cases(users, ops, fits, seed, model_dir):
+    rng = np.random.default_rng(seed + 1)
+    names = workloads.user_names(users)
+    cases = {}
+
+    def pick(n):
+        return [names[i] for i in rng.integers(0, users, n)]
+
+    cases["get_user_transactions"] = measure(
+        database.get_user_transactions, [(u,) for u in pick(ops)]
+    )
+
+    cases["insert_transaction"] = measure(
+        database.insert_transaction,
+        [(u, float(a)) for u, a in zip(pick(ops), workloads.amounts(ops, 800.0, rng))]
+    )
+
+    # Models: histories fetched up front so only the fit is timed
+    sample = [u for u in dict.fromkeys(pick(fits * 4))
+              if len(database.get_user_transactions(u)) >= 5][:fits]
+    histories = [database.get_user_transactions(u) for u in sample]
+    models = []
+    cases["train_user_model"] = measure(
+        lambda h: models.append(train_user_model(h)), [(h,) for h in histories]
+    )
+
+    cases["predict_user_risk"] = measure(
+        predict_user_risk,
+        [(models[i % len(models)], float(a))
+         for i, a in enumerate(workloads.amounts(ops, 800.0, rng))]
+    ) if models else None
+
+    # Risk Intelligence path: user_stats + registry + predict. Cold fits
+    # (and persists) each model, warm hits the in-memory registry.
+    engine = RiskEngine(
+        models=ModelRegistry(store=ModelStore(model_dir))
+    )
+    cases["risk_score_latest_cold"] = measure(engine.score_latest, [(u,) for u in sample])
+    cases["risk_score_latest_warm"] = measure(
+        engine.score_latest, [(sample[i % len(sample)],) for i in range(ops)]
+    ) if sample else None
+    cases["risk_score_amount_warm"] = measure(
+        engine.score,
+        [(sample[i % len(sample)], float(a))
+         for i, a in enumerate(workloads.amounts(ops, 800.0, rng))]
+    ) if sample else None
+
+    # QR: distinct payments render, repeats are cache hits
+    uris = [
+        upi_uri(f"{u}@upi", u, float(a), "Order")
+        for u, a in zip(pick(ops), workloads.amounts(ops, 800.0, rng))
+    ]
+    cases["qr_render"] = measure(render_png, [(uri,) for uri in uris])
+    service = QRService()
+    for uri in uris:
+        service.render(uri)
+    cases["qr_render_cached"] = measure(service.render, [(uri,) for uri in uris])
+
+    return {name: result for name, result in cases.items() if result is not None}
+
+
+# ---------------- RESULTS ----------------
+def git_commit():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=REPO_DIR
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            capture_output=True, text=True, check=True, cwd=REPO_DIR
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + ("-dirty" if dirty else "")
+
+
+def save_results(results, directory=RESULTS_DIR, prefix=""):
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.fromtimestamp(results["meta"]["timestamp"]).strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(directory, f"{prefix}{stamp}-{results['meta']['commit']}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    return path
+
+
+def latest_results(meta, directory=RESULTS_DIR, exclude=None):
+    # Newest saved run with the same workload size, or None
+    try:
+        names = sorted(os.listdir(directory), reverse=True)
+    except OSError:
+        return None
+
+    for name in names:
+        path = os.path.join(directory, name)
+        if not name[:1].isdigit() or not name.endswith(".json") or path == exclude:
+            continue
+        try:
+            with open(path, encoding="utf-8") as f:
+                previous = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if all(previous["meta"].get(k) == meta[k] for k in ("rows", "users", "ops")):
+            return previous
+    return None
+
+
+def compare(current, baseline, threshold=REGRESSION_THRESHOLD):
+    # Rows of (case, p95 before/after, throughput before/after, regressed)
+    rows = []
+    for name, now in current["cases"].items():
+        before = baseline["cases"].get(name)
+        if before is None:
+            continue
+        regressed = (
+            now["p95_ms"] > before["p95_ms"] * (1 + threshold)
+            or now["ops_per_sec"] < before["ops_per_sec"] * (1 - threshold)
+        )
+        rows.append((name, before["p95_ms"], now["p95_ms"],
+                     before["ops_per_sec"], now["ops_per_sec"], regressed))
+    return rows
+
+
+def print_results(results):
+    print(f"{'case':<26}{'count':>8}{'ops/s':>12}{'mean ms':>10}"
+          f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, r in results["cases"].items():
+        print(f"{name:<26}{r['count']:>8}{r['ops_per_sec']:>12.1f}{r['mean_ms']:>10.3f}"
+              f"{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}{r['p99_ms']:>10.3f}")
+
+
+def print_comparison(rows, baseline):
+    print(f"\nvs {baseline['meta']['commit']} "
+          f"({datetime.fromtimestamp(baseline['meta']['timestamp']):%Y-%m-%d %H:%M})")
+    for name, p95_before, p95_now, ops_before, ops_now, regressed in rows:
+        print(f"{name:<26}p95 {p95_before:>9.3f} -> {p95_now:>9.3f} ms   "
+              f"{ops_before:>10.1f} -> {ops_now:>10.1f} ops/s"
+              f"{'   REGRESSION' if regressed else ''}")
+
+
+# ---------------- COMMAND LINE ----------------
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Artha AI end-to-end benchmarks")
+    parser.add_argument("--rows", type=workloads.parse_count, default=DEFAULT_ROWS,
+                        help="synthetic transactions, e.g. 1k, 100k, 10M")
+    parser.add_argument("--users", type=workloads.parse_count, default=DEFAULT_USERS)
+    parser.add_argument("--ops", type=int, default=DEFAULT_OPS, help="calls per latency case")
+    parser.add_argument("--fits", type=int, default=DEFAULT_FITS, help="model fits per cold case")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db", default=workloads.SCRATCH_DB, help="scratch database file")
+    parser.add_argument("--reuse", action="store_true",
+                        help="keep an already loaded scratch database of the same size")
+    parser.add_argument("--compare", help="results file to compare with (default: latest matching run)")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+
+    if os.path.abspath(args.db) == os.path.abspath(database.DB_NAME):
+        parser.error("refusing to benchmark against the application database")
+
+    reuse = args.reuse and os.path.exists(args.db)
+    workloads.use_scratch_db(args.db, fresh=not reuse)
+    if reuse and workloads.transaction_count() < args.rows:
+        workloads.use_scratch_db(args.db, fresh=True)
+        reuse = False
+
+    meta = {
+        "timestamp": time.time(),
+        "commit": git_commit(),
+        "rows": args.rows,
+        "users": args.users,
+        "ops": args.ops,
+        "fits": args.fits,
+        "seed": args.seed,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+    cases = {}
+    if not reuse:
+        print(f"loading {args.rows:,} transactions for {args.users:,} users...", file=sys.stderr)
+        cases["bulk_load"] = measure_load(workloads.load(args.rows, args.users, args.seed))
+
+    # Empty model store every run, so the cold case always fits
+    with tempfile.TemporaryDirectory(prefix="bench-models-") as model_dir:
+        cases.update(run_cases(args.users, args.ops, args.fits, args.seed, model_dir))
+    results = {"meta": meta, "cases": cases}
+    print_results(results)
+
+    path = None if args.no_save else save_results(results)
+    if path:
+        print(f"\nsaved {path}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    else:
+        baseline = latest_results(meta, exclude=path)
+
+    if baseline is not None:
+        rows = compare(results, baseline, args.threshold)
+        print_comparison(rows, baseline)
+        if any(row[-1] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
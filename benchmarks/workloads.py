@@ -0,0 +1,142 @@
+import os
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import database
+
+# ---------------- WORKLOAD SETTINGS ----------------
+SCRATCH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scratch")
+SCRATCH_DB = os.path.join(SCRATCH_DIR, "bench.db")
+
+HISTORY_DAYS = 365            # synthetic history ends "now" and spans a year
+LOAD_CHUNK = 50_000           # rows per insert_transactions_bulk() call
+ACTIVITY_SHAPE = 1.2          # Pareto shape: a few heavy merchants, long tail
+REPLAY_SYMBOLS = ("^NSEI", "^BSESN", "RELIANCE.NS")
+REPLAY_BARS = {"5m": 400, "1d": 600}      # bars per symbol and interval
+MEDIAN_AMOUNT = 800.0         # typical ticket in rupees, varies per user
+OUTLIER_RATE = 0.02           # share of amounts inflated 5-20x
+
+
+def parse_count(text):
+    # "10k" / "2.5M" / "1000" -> int, for command-line sizes
+    text = str(text).strip().lower().replace("_", "")
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    if scale != 1:
+        text = text[:-1]
+    return int(float(text) * scale)
+
+
+# ---------------- SCRATCH DATABASE ----------------
+def use_scratch_db(path=SCRATCH_DB, fresh=True):
+    # Points the database module at `path` instead of fintech.db (the same
+    # switch its command line uses) and creates the schema there
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if fresh:
+        database.close_connections()
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(path + suffix)
+            except FileNotFoundError:
+                pass
+
+    database.DB_NAME = path
+    database.init_db(force=fresh)
+    return path
+
+
+def transaction_count():
+    with database.connection() as conn:
+        return conn.execute(database.SQL_MAX_TRANSACTION_ID).fetchone()[0]
+
+
+# ---------------- SYNTHETIC USERS ----------------
+def user_names(users):
+    return [f"bench{i:06d}" for i in range(users)]
+
+
+def activity(rows, users, rng):
+    # Transactions per user summing to `rows`, Pareto-skewed
+    weights = rng.pareto(ACTIVITY_SHAPE, users) + 1.0
+    counts = np.floor(weights / weights.sum() * rows).astype(np.int64)
+    np.add.at(counts, rng.integers(0, users, rows - counts.sum()), 1)
+    return counts
+
+
+def amounts(count, median, rng):
+    values = rng.lognormal(np.log(median), 0.6, count)
+    outliers = rng.random(count) < OUTLIER_RATE
+    values[outliers] *= rng.uniform(5, 20, outliers.sum())
+    return np.round(values, 2)
+
+
+def iter_transactions(rows, users, seed=0, chunk=LOAD_CHUNK, end=None):
+    # Yields lists of (username, amount, timestamp) of at most `chunk` rows.
+    # Each user's timestamps are increasing, so insertion order matches
+    # time order per user as it does in the app. Memory stays O(chunk)
+    # whatever `rows` is.
+    rng = np.random.default_rng(seed)
+    counts = activity(rows, users, rng)
+    medians = rng.lognormal(np.log(MEDIAN_AMOUNT), 1.0, users)
+
+    end = np.datetime64(end or datetime.now(), "us")
+    span_us = int(timedelta(days=HISTORY_DAYS) / timedelta(microseconds=1))
+    start = end - np.timedelta64(span_us, "us")
+
+    batch = []
+    for name, count, median in zip(user_names(users), counts, medians):
+        step = span_us / max(count, 1)
+        lo = 0
+        while lo < count:
+            n = min(chunk - len(batch), count - lo)
+            # One slot of `step` per transaction, jittered inside the slot
+            offsets = ((np.arange(lo, lo + n) + rng.random(n)) * step).astype(np.int64)
+            stamps = (start + offsets.astype("timedelta64[us]")).astype(str)
+            batch.extend(zip([name] * n, amounts(n, median, rng).tolist(), stamps.tolist()))
+            lo += n
+            if len(batch) == chunk:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def load(rows, users, seed=0, chunk=LOAD_CHUNK):
+    # Bulk-loads a synthetic history into the current database; returns
+    # (rows, seconds) per insert_transactions_bulk() call
+    timings = []
+    for batch in iter_transactions(rows, users, seed, chunk):
+        started = time.perf_counter()
+        database.insert_transactions_bulk(batch)
+        timings.append((len(batch), time.perf_counter() - started))
+    return timings
+
+
+# ---------------- SYNTHETIC MARKET DATA ----------------
+def write_replay(directory, symbols=REPLAY_SYMBOLS, seed=0, end=None):
+    # Random-walk OHLCV in the <symbol>_<interval>.csv layout that
+    # market_data.ReplaySource reads (ARTHA_MARKET_REPLAY_DIR), so pages
+    # that chart markets run without network access
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp(end or datetime.now(), tz="UTC").floor("5min")
+
+    for symbol in symbols:
+        level = rng.uniform(1_000, 80_000)
+        for interval, bars in REPLAY_BARS.items():
+            freq = "5min" if interval == "5m" else "B"
+            index = pd.date_range(end=end, periods=bars, freq=freq)
+            close = level * np.exp(np.cumsum(rng.normal(0, 0.004, bars)))
+            open_ = close * (1 + rng.normal(0, 0.001, bars))
+            pd.DataFrame({
+                "Open": open_,
+                "High": np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.002, bars))),
+                "Low": np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.002, bars))),
+                "Close": close,
+                "Volume": rng.integers(1_000, 100_000, bars).astype(float),
+            }, index=index.rename("Datetime")).to_csv(
+                os.path.join(directory, f"{symbol}_{interval}.csv")
+            )
+    return directory
@@ -0,0 +1,161 @@
+import io
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import matplotlib.dates as mdates
+
+from metrics import timed, inc
+
+# ---------------- CHART SETTINGS ----------------
+POINT_BUDGET = 500            # points drawn per series, whatever its length
+CHART_CACHE_SIZE = 64         # rendered PNGs kept (LRU), shared by sessions
+CHART_DPI = 100
+
+
+# ---------------- DOWNSAMPLING ----------------
+def lttb(x, y, n_out=POINT_BUDGET):
+    # Largest-Triangle-Three-Buckets: keeps the first and last points and,
+    # per bucket, the point forming the largest triangle with the previous
+    # kept point and the next bucket's mean. Preserves visual shape far
+    # better than striding. Returns indices into x/y.
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    keep = np.empty(n_out, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_lo, nxt_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        cx = x[nxt_lo:nxt_hi].mean()
+        cy = y[nxt_lo:nxt_hi].mean()
+
+        area = np.abs(
+            (x[a] - cx) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi]) * (cy - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+
+    return keep
+
+
+def minmax_decimate(y, n_out=POINT_BUDGET):
+    # Keeps the min and max of each of n_out / 2 buckets (in time order), so
+    # spikes survive. Cheaper than LTTB; returns indices.
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    buckets = n_out // 2
+    if n <= n_out or buckets < 1:
+        return np.arange(n)
+
+    edges = np.linspace(0, n, buckets + 1).astype(int)
+    keep = []
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        chunk = y[lo:hi]
+        keep.extend(sorted({lo + int(np.argmin(chunk)), lo + int(np.argmax(chunk))}))
+    return np.asarray(keep)
+
+
+DOWNSAMPLERS = {"lttb": lttb, "minmax": lambda x, y, n: minmax_decimate(y, n)}
+
+
+# ---------------- CHART CACHE ----------------
+class ChartCache:
+    # Rendered PNG bytes keyed by (chart name, data version). Rendering runs
+    # outside the lock; two sessions racing on the same key both render
+    # and the later result wins, which is harmless.
+
+    def __init__(self, max_size=CHART_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_render(self, key, render):
+        with self._lock:
+            png = self._entries.get(key)
+            if png is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                inc("chart.cache_hits")
+                return png
+            self.misses += 1
+        inc("chart.cache_misses")
+
+        png = render()
+
+        with self._lock:
+            self._entries[key] = png
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return png
+
+
+cache = ChartCache()
+
+
+@timed("chart.render")
+def _render(draw, figsize):
+    # A bare Figure with its own Agg canvas: no pyplot global state, so
+    # concurrent sessions never draw on each other's figure, and nothing
+    # outlives this call
+    fig = Figure(figsize=figsize, dpi=CHART_DPI)
+    canvas = FigureCanvasAgg(fig)
+    try:
+        draw(fig)
+        buffer = io.BytesIO()
+        canvas.print_png(buffer)
+        return buffer.getvalue()
+    finally:
+        fig.clear()
+
+
+# ---------------- CHARTS ----------------
+def line_chart(name, version, x, series, title="", xlabel="", ylabel="",
+               method="lttb", budget=POINT_BUDGET, figsize=(6.4, 4.8)):
+    # series: {label: (y values, plot kwargs)} sharing the datetime x axis.
+    # version: anything hashable that changes when the data does.
+    def draw(fig):
+        ax = fig.add_subplot()
+        xs = mdates.date2num(x) if len(x) else np.asarray([], dtype=float)
+        for label, (y, style) in series.items():
+            keep = DOWNSAMPLERS[method](xs, y, budget)
+            ax.plot(
+                mdates.num2date(xs[keep]) if len(keep) else [],
+                np.asarray(y, dtype=float)[keep],
+                label=label,
+                **style
+            )
+        ax.set_title(title)
+        ax.set_xlabel(xlabel)
+        ax.set_ylabel(ylabel)
+        ax.legend()
+        fig.autofmt_xdate()
+
+    return cache.get_or_render(
+        (name, version, method, budget, figsize),
+        lambda: _render(draw, figsize)
+    )
+
+
+def pie_chart(name, version, values, labels, title="", figsize=(6.4, 4.8)):
+    def draw(fig):
+        ax = fig.add_subplot()
+        ax.pie(values, labels=labels, autopct="%1.1f%%")
+        ax.set_title(title)
+
+    return cache.get_or_render(
+        (name, version, tuple(values), tuple(labels), figsize),
+        lambda: _render(draw, figsize)
+    )
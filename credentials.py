@@ -0,0 +1,154 @@
+import os
+import hmac
+import base64
+import hashlib
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# ---------------- HASHING SETTINGS ----------------
+# Stored hashes carry their own scheme and cost, so these can be raised at
+# any time: older rows keep verifying and are upgraded on the next login.
+SCHEME = "scrypt" if hasattr(hashlib, "scrypt") else "pbkdf2_sha256"
+SCRYPT_N = 2 ** 14            # CPU/memory cost; 128 * N * r bytes = 16 MB per hash
+SCRYPT_R = 8
+SCRYPT_P = 1
+PBKDF2_ITERATIONS = 600_000   # used where OpenSSL has no scrypt
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+# ---------------- VERIFICATION POOL SETTINGS ----------------
+VERIFY_WORKERS = min(4, os.cpu_count() or 1)   # hashes running at once
+VERIFY_QUEUE = 64             # logins waiting for a worker before callers block
+VERIFY_TIMEOUT = 30           # seconds a login may wait for a worker
+
+
+# ---------------- ENCODING ----------------
+# scrypt$<N>$<r>$<p>$<salt>$<key>
+# pbkdf2_sha256$<iterations>$<salt>$<key>
+# <64 hex chars>                  legacy unsalted sha256
+def current_params(scheme=SCHEME):
+    if scheme == "scrypt":
+        return (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return (PBKDF2_ITERATIONS,)
+
+
+def _b64(data):
+    return base64.b64encode(data).decode().rstrip("=")
+
+
+def _unb64(text):
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def parse(encoded):
+    # (scheme, params, salt, key); raises ValueError for unknown formats
+    parts = encoded.split("$")
+    if parts[0] == "scrypt" and len(parts) == 6:
+        return "scrypt", tuple(map(int, parts[1:4])), _unb64(parts[4]), _unb64(parts[5])
+    if parts[0] == "pbkdf2_sha256" and len(parts) == 4:
+        return "pbkdf2_sha256", (int(parts[1]),), _unb64(parts[2]), _unb64(parts[3])
+    if len(encoded) == 64:
+        return "sha256", (), b"", bytes.fromhex(encoded)
+    raise ValueError("unrecognised password hash")
+
+
+def _derive(password, scheme, params, salt):
+    password = password.encode()
+    if scheme == "scrypt":
+        n, r, p = params
+        return hashlib.scrypt(
+            password, salt=salt, n=n, r=r, p=p, dklen=KEY_BYTES,
+            maxmem=128 * r * (n + p + 2) + (1 << 20)
+        )
+    if scheme == "pbkdf2_sha256":
+        return hashlib.pbkdf2_hmac("sha256", password, salt, params[0], KEY_BYTES)
+    if scheme == "sha256":
+        return hashlib.sha256(password).digest()
+    raise ValueError(f"unknown scheme {scheme!r}")
+
+
+# ---------------- HASH / VERIFY ----------------
+def hash_password(password, scheme=SCHEME, params=None):
+    params = params or current_params(scheme)
+    salt = secrets.token_bytes(SALT_BYTES)
+    key = _derive(password, scheme, params, salt)
+    return "$".join([scheme, *map(str, params), _b64(salt), _b64(key)])
+
+
+_dummy = None
+
+
+def verify_password(password, encoded):
+    # encoded=None (unknown user) does the same work as a real check and
+    # fails, so response time doesn't reveal which usernames exist
+    global _dummy
+    if encoded is None:
+        if _dummy is None:
+            _dummy = hash_password("")
+        verify_password(password, _dummy)
+        return False
+
+    try:
+        scheme, params, salt, key = parse(encoded)
+        return hmac.compare_digest(_derive(password, scheme, params, salt), key)
+    except ValueError:
+        return False
+
+
+def needs_rehash(encoded, scheme=SCHEME, params=None):
+    # True for legacy sha256 rows and for hashes made with other settings
+    try:
+        stored_scheme, stored_params, _, _ = parse(encoded)
+    except ValueError:
+        return True
+    return (stored_scheme, stored_params) != (scheme, params or current_params(scheme))
+
+
+# ---------------- VERIFICATION POOL ----------------
+class CredentialPool:
+    # Runs KDF work off the Streamlit script threads. hashlib releases the
+    # GIL while deriving, so workers use separate cores. The worker count
+    # caps CPU and scrypt memory during a login storm; the semaphore caps
+    # queued logins, after which callers wait (up to a timeout) instead of
+    # piling up unbounded work.
+
+    def __init__(self, workers=VERIFY_WORKERS, queue_size=VERIFY_QUEUE):
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="credentials"
+        )
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def submit(self, fn, *args, timeout=VERIFY_TIMEOUT):
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError("credential workers are busy")
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def verify(self, password, encoded, timeout=VERIFY_TIMEOUT):
+        return self.submit(verify_password, password, encoded, timeout=timeout).result(timeout)
+
+    def hash(self, password, timeout=VERIFY_TIMEOUT):
+        return self.submit(hash_password, password, timeout=timeout).result(timeout)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+_credential_pool = None
+_credential_pool_lock = threading.Lock()
+
+
+def get_credential_pool():
+    global _credential_pool
+    if _credential_pool is None:
+        with _credential_pool_lock:
+            if _credential_pool is None:
+                _credential_pool = CredentialPool()
+    return _credential_pool
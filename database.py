@@ -1,112 +1,1006 @@
+import sys
+import math
 import sqlite3
-import hashlib
-from datetime import datetime
+import queue
+import time
+import atexit
+import logging
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from metrics import timed, inc
+from credentials import get_credential_pool, needs_rehash
 
 DB_NAME = "fintech.db"
 
+logger = logging.getLogger(__name__)
+
+# ---------------- CONNECTION SETTINGS ----------------
+# Applied once to every pooled connection when it is opened.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",        # readers never block the writer
+    "PRAGMA synchronous=NORMAL",      # fsync on checkpoint, not every commit
+    "PRAGMA cache_size=-16000",       # ~16 MB page cache per connection
+    "PRAGMA mmap_size=268435456",     # 256 MB memory-mapped reads
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+POOL_SIZE = 8                 # idle connections kept per database file
+STATEMENT_CACHE_SIZE = 128    # prepared statements cached per connection
+
+GROUP_COMMIT_ROWS = 500       # commit the writer queue every N rows ...
+GROUP_COMMIT_DELAY_MS = 20    # ... or every M milliseconds, whichever first
+
+# ---------------- ANALYTICS SETTINGS ----------------
+HIGH_RISK_AMOUNT = 5000       # analytics count amounts above this as high risk
+
+# Timestamps are ISO strings, so a bucket is a fixed-length prefix
+BUCKET_PREFIX = {"minute": 16, "hour": 13, "day": 10}
+BUCKET_WIDTH = {
+    "day": timedelta(days=1),
+    "hour": timedelta(hours=1),
+    "minute": timedelta(minutes=1),
+}
+ROLLUP_GRAINS = ("day", "hour", "minute")     # coarsest first
+ALL_USERS = ""                # rollup rows for everyone use this username
+
+# SQL is kept in module constants so every call hits the statement cache
+SQL_INSERT_USER = "INSERT INTO users (username, password) VALUES (?, ?)"
+SQL_SELECT_PASSWORD = "SELECT password FROM users WHERE username = ?"
+SQL_SELECT_USER = "SELECT id, username FROM users WHERE username = ?"
+SQL_UPDATE_PASSWORD = (
+    "UPDATE users SET password = ? WHERE username = ? AND password = ?"
+)
+SQL_INSERT_TRANSACTION = (
+    "INSERT INTO transactions (username, amount, timestamp) VALUES (?, ?, ?)"
+)
+SQL_SELECT_AMOUNTS = (
+    "SELECT amount FROM transactions WHERE username = ? ORDER BY id ASC"
+)
+SQL_SELECT_LAST_AMOUNTS = (
+    "SELECT amount FROM transactions WHERE username = ? "
+    "ORDER BY id DESC LIMIT ?"
+)
+SQL_SELECT_PAGE = (
+    "SELECT id, amount, timestamp FROM transactions "
+    "WHERE username = ? AND id > ? AND id < ? ORDER BY id ASC LIMIT ?"
+)
+SQL_SELECT_BETWEEN = (
+    "SELECT id, amount, timestamp FROM transactions "
+    "WHERE username = ? AND timestamp >= ? AND timestamp < ? ORDER BY id ASC"
+)
+SQL_SELECT_STATS = (
+    "SELECT count, total, mean, m2, min_amount, max_amount, "
+    "last_amount, last_timestamp FROM user_stats WHERE username = ?"
+)
+SQL_UPSERT_STATS = (
+    "INSERT OR REPLACE INTO user_stats (username, count, total, mean, m2, "
+    "min_amount, max_amount, last_amount, last_timestamp) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+# Analytics: {where} is filled from _ANALYTICS_WHERE, so each query has one
+# statement per scope (single user or everyone)
+SQL_SUMMARY = (
+    "SELECT COUNT(*), TOTAL(amount), MIN(amount), MAX(amount), "
+    "TOTAL(amount > ?) FROM transactions WHERE {where}"
+)
+SQL_SERIES = (
+    "SELECT substr(timestamp, 1, ?) AS bucket, COUNT(*), TOTAL(amount), "
+    "MIN(amount), MAX(amount), TOTAL(amount > ?) FROM transactions "
+    "WHERE {where} GROUP BY bucket ORDER BY bucket"
+)
+SQL_MAX_TRANSACTION_ID = "SELECT IFNULL(MAX(id), 0) FROM transactions"
+_ROLLUP_MERGE = (
+    "ON CONFLICT (grain, username, bucket) DO UPDATE SET "
+    "count = count + excluded.count, "
+    "total = total + excluded.total, "
+    "min_amount = MIN(min_amount, excluded.min_amount), "
+    "max_amount = MAX(max_amount, excluded.max_amount), "
+    "high_risk = high_risk + excluded.high_risk"
+)
+# NOT INDEXED keeps the planner on the rowid range (the batch) instead of
+# scanning a timestamp index for the GROUP BY. The WHERE clause also keeps
+# SQLite from parsing ON CONFLICT as a join.
+SQL_UPDATE_ROLLUPS_USER = (
+    "INSERT INTO transaction_rollups SELECT :grain, username, "
+    "substr(timestamp, 1, :prefix), COUNT(*), TOTAL(amount), MIN(amount), "
+    "MAX(amount), TOTAL(amount > :threshold) FROM transactions NOT INDEXED "
+    "WHERE id > :after_id AND timestamp IS NOT NULL "
+    "GROUP BY username, substr(timestamp, 1, :prefix) " + _ROLLUP_MERGE
+)
+SQL_UPDATE_ROLLUPS_ALL = (
+    "INSERT INTO transaction_rollups SELECT :grain, :everyone, "
+    "substr(timestamp, 1, :prefix), COUNT(*), TOTAL(amount), MIN(amount), "
+    "MAX(amount), TOTAL(amount > :threshold) FROM transactions NOT INDEXED "
+    "WHERE id > :after_id AND timestamp IS NOT NULL "
+    "GROUP BY substr(timestamp, 1, :prefix) " + _ROLLUP_MERGE
+)
+SQL_ROLLUP_RANGE = (
+    "SELECT TOTAL(count), TOTAL(total), MIN(min_amount), MAX(max_amount), "
+    "TOTAL(high_risk) FROM transaction_rollups "
+    "WHERE grain = ? AND username = ? AND bucket >= ? AND bucket < ?"
+)
+SQL_ROLLUP_SERIES = (
+    "SELECT bucket, count, total, min_amount, max_amount, high_risk "
+    "FROM transaction_rollups "
+    "WHERE grain = ? AND username = ? AND bucket >= ? AND bucket < ? "
+    "ORDER BY bucket"
+)
+_ANALYTICS_WHERE = {
+    True: "username = ? AND timestamp >= ? AND timestamp < ?",
+    False: "timestamp >= ? AND timestamp < ?",
+}
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version.
+# Entries are SQL strings or callables taking the open connection; each
+# comment gives the user_version an entry brings the database to.
+MIGRATIONS = (
+    # 1: per-user history lookups and keyset pagination
+    "CREATE INDEX IF NOT EXISTS idx_transactions_username_id "
+    "ON transactions (username, id)",
+
+    # 2: running per-user statistics for the risk engine
+    """
+    CREATE TABLE IF NOT EXISTS user_stats (
+        username TEXT PRIMARY KEY,
+        count INTEGER NOT NULL,
+        total REAL NOT NULL,
+        mean REAL NOT NULL,
+        m2 REAL NOT NULL,
+        min_amount REAL,
+        max_amount REAL,
+        last_amount REAL,
+        last_timestamp TEXT
+    )
+    """,
+
+    # 3: backfill statistics from existing rows
+    lambda conn: _rebuild_user_stats(conn),
+
+    # 4: per-transaction features kept by feature_store (baseline *before*
+    # each transaction, so count/mean/m2 resume the running statistics)
+    """
+    CREATE TABLE IF NOT EXISTS transaction_features (
+        id INTEGER PRIMARY KEY,
+        username TEXT NOT NULL,
+        timestamp TEXT,
+        amount REAL NOT NULL,
+        count INTEGER NOT NULL,
+        mean REAL,
+        m2 REAL NOT NULL,
+        std REAL,
+        deviation REAL,
+        rolling_mean REAL,
+        rolling_std REAL
+    )
+    """,
+    # 5: per-user feature lookups in id order
+    "CREATE INDEX IF NOT EXISTS idx_transaction_features_username_id "
+    "ON transaction_features (username, id)",
+
+    # 6: covering index for per-user time-range analytics
+    "CREATE INDEX IF NOT EXISTS idx_transactions_username_timestamp "
+    "ON transactions (username, timestamp, amount)",
+    # 7: covering index for global time-range analytics
+    "CREATE INDEX IF NOT EXISTS idx_transactions_timestamp "
+    "ON transactions (timestamp, amount)",
+
+    # 8: minute/hour/day rollups per user and for everyone (ALL_USERS)
+    """
+    CREATE TABLE IF NOT EXISTS transaction_rollups (
+        grain TEXT NOT NULL,
+        username TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        total REAL NOT NULL,
+        min_amount REAL,
+        max_amount REAL,
+        high_risk INTEGER NOT NULL,
+        PRIMARY KEY (grain, username, bucket)
+    ) WITHOUT ROWID
+    """,
+
+    # 9: backfill rollups from existing rows
+    lambda conn: _rebuild_rollups(conn),
+
+    # 10: recompute rollups that overlapping writers double-counted before
+    # _write_transactions took the write lock up front
+    lambda conn: _rebuild_rollups(conn),
+)
+
+
+# ---------------- CONNECTION POOL ----------------
+def open_connection(path):
+    conn = sqlite3.connect(
+        path,
+        timeout=5.0,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE_SIZE
+    )
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class ConnectionPool:
+
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = open_connection(self.path)
+
+        try:
+            yield conn
+        except sqlite3.Error:
+            # Don't hand a possibly broken connection to the next caller
+            conn.close()
+            raise
+        except BaseException:
+            # Any other error (a timeout, st.stop(), ...) leaves the
+            # connection usable once its transaction is rolled back
+            self._release(conn)
+            raise
+        else:
+            self._release(conn)
+
+    def _release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            return
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool():
+    pool = _pools.get(DB_NAME)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(DB_NAME)
+            if pool is None:
+                pool = _pools[DB_NAME] = ConnectionPool(DB_NAME)
+    return pool
+
+
+def connection():
+    return get_pool().connection()
+
+
+@atexit.register
+def close_connections():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close_all()
+
+
 # ---------------- DATABASE INITIALIZATION ----------------
-def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-
-    # Users table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE,
-            password TEXT
-        )
-    """)
-
-    # Transactions table (with timestamp)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS transactions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT,
-            amount REAL,
-            timestamp TEXT
-        )
-    """)
+_initialized = set()
+_init_lock = threading.Lock()
+
+
+@timed("db.init")
+def init_db(force=False):
+    # Schema work runs once per process and database file, not per rerun
+    if DB_NAME in _initialized and not force:
+        return
+
+    with _init_lock:
+        if DB_NAME in _initialized and not force:
+            return
+
+        with connection() as conn:
+            with conn:
+                # Users table
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS users (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        username TEXT UNIQUE,
+                        password TEXT
+                    )
+                """)
+
+                # Transactions table (with timestamp)
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS transactions (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        username TEXT,
+                        amount REAL,
+                        timestamp TEXT
+                    )
+                """)
 
-    conn.commit()
-    conn.close()
+                _migrate(conn)
 
+        _initialized.add(DB_NAME)
 
-# ---------------- PASSWORD HASHING ----------------
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+
+def _migrate(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+
+    for number, statement in enumerate(MIGRATIONS[version:], version + 1):
+        if callable(statement):
+            statement(conn)
+        else:
+            conn.execute(statement)
+        conn.execute(f"PRAGMA user_version = {number}")
 
 
 # ---------------- REGISTER USER ----------------
 def register_user_db(username, password):
     username = username.lower().strip()
+    # Hash before checking out a connection: the KDF (and any wait for a
+    # credential worker) must not hold one
+    encoded = get_credential_pool().hash(password)
 
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-
-    try:
-        cursor.execute(
-            "INSERT INTO users (username, password) VALUES (?, ?)",
-            (username, hash_password(password))
-        )
-        conn.commit()
-        return True
-    except sqlite3.IntegrityError:
-        return False
-    finally:
-        conn.close()
+    with connection() as conn:
+        try:
+            with conn:
+                conn.execute(SQL_INSERT_USER, (username, encoded))
+            return True
+        except sqlite3.IntegrityError:
+            return False
 
 
 # ---------------- AUTHENTICATE USER ----------------
 def authenticate_user_db(username, password):
     username = username.lower().strip()
 
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+    with connection() as conn:
+        result = conn.execute(SQL_SELECT_PASSWORD, (username,)).fetchone()
 
-    cursor.execute(
-        "SELECT password FROM users WHERE username = ?",
-        (username,)
-    )
+    # Salted KDF on the credential pool; unknown users cost the same
+    pool = get_credential_pool()
+    stored = result[0] if result is not None else None
+    if not pool.verify(password, stored):
+        return False
 
-    result = cursor.fetchone()
-    conn.close()
+    if needs_rehash(stored):
+        # Legacy sha256 row or older cost settings: upgrade while the
+        # plain password is at hand. Skipped if it changed meanwhile.
+        encoded = pool.hash(password)
+        with connection() as conn:
+            with conn:
+                conn.execute(SQL_UPDATE_PASSWORD, (encoded, username, stored))
+    return True
 
-    if result is None:
-        return False
 
-    return result[0] == hash_password(password)
+# ---------------- USER RECORD ----------------
+def get_user_record(username):
+    # {"id", "username"} or None
+    with connection() as conn:
+        row = conn.execute(SQL_SELECT_USER, (username.lower().strip(),)).fetchone()
+    return {"id": row[0], "username": row[1]} if row else None
 
 
 # ---------------- INSERT TRANSACTION ----------------
+def _transaction_row(username, amount, timestamp=None):
+    return (
+        username.lower().strip(),
+        float(amount),
+        _as_timestamp(timestamp) if timestamp else datetime.now().isoformat()
+    )
+
+
+@timed("db.write_transactions")
+def _write_transactions(conn, rows):
+    # Caller owns the transaction; rows are already normalised. Take the
+    # write lock before reading the high-water mark: sqlite3 only begins at
+    # the first INSERT, and another connection committing in between would
+    # have its rows folded into the rollups a second time.
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+    last_id = conn.execute(SQL_MAX_TRANSACTION_ID).fetchone()[0]
+    count = conn.executemany(SQL_INSERT_TRANSACTION, rows).rowcount
+    _update_user_stats(conn, rows)
+    _update_rollups(conn, last_id)
+    inc("db.transactions_written", count)
+    return count
+
+
 def insert_transaction(username, amount):
+    row = _transaction_row(username, amount)
+    with connection() as conn:
+        with conn:
+            _write_transactions(conn, [row])
+    _notify_written([row])
+
+
+# ---------------- WRITE LISTENERS ----------------
+# Called with the set of usernames after their transactions commit (and
+# after group-commit futures resolve), so in-process caches can drop what
+# they hold for those users. The rows are saved by then: a failing
+# listener is logged and skipped, never reported as a failed write.
+_write_listeners = []
+
+
+def add_write_listener(callback):
+    _write_listeners.append(callback)
+
+
+def _notify_written(rows):
+    usernames = {row[0] for row in rows}
+    for callback in _write_listeners:
+        try:
+            callback(usernames)
+        except Exception:
+            inc("db.write_listener_errors")
+            logger.exception("write listener %r failed", callback)
+
+
+# ---------------- BULK INSERT ----------------
+def insert_transactions_bulk(transactions):
+    # Accepts (username, amount) or (username, amount, timestamp) items and
+    # loads them all in a single transaction. Returns the number of rows.
+    rows = [_transaction_row(*t) for t in transactions]
+    if not rows:
+        return 0
+
+    with connection() as conn:
+        with conn:
+            count = _write_transactions(conn, rows)
+    _notify_written(rows)
+    return count
+
+
+# ---------------- RUNNING STATISTICS ----------------
+# One row per user holding Welford's running mean and M2 (sum of squared
+# deviations), so mean/std of any history length is an O(1) lookup.
+def _batch_stats(amounts):
+    n = len(amounts)
+    mean = sum(amounts) / n
+    m2 = sum((x - mean) ** 2 for x in amounts)
+    return n, mean, m2
+
+
+def _merge_stats(existing, rows):
+    # Chan et al. parallel combination of existing stats with a new batch
+    amounts = [amount for _, amount, _ in rows]
+    nb, mean_b, m2_b = _batch_stats(amounts)
+
+    if existing is None:
+        count, total, mean, m2 = nb, sum(amounts), mean_b, m2_b
+        low, high = min(amounts), max(amounts)
+    else:
+        na, total_a, mean_a, m2_a, low, high, _, _ = existing
+        count = na + nb
+        delta = mean_b - mean_a
+        mean = mean_a + delta * nb / count
+        m2 = m2_a + m2_b + delta * delta * na * nb / count
+        total = total_a + sum(amounts)
+        low, high = min(low, min(amounts)), max(high, max(amounts))
+
+    _, last_amount, last_timestamp = rows[-1]
+    return count, total, mean, m2, low, high, last_amount, last_timestamp
+
+
+def _update_user_stats(conn, rows):
+    by_user = {}
+    for row in rows:
+        by_user.setdefault(row[0], []).append(row)
+
+    for username, user_rows in by_user.items():
+        existing = conn.execute(SQL_SELECT_STATS, (username,)).fetchone()
+        conn.execute(
+            SQL_UPSERT_STATS,
+            (username,) + _merge_stats(existing, user_rows)
+        )
+
+
+def _rebuild_user_stats(conn, username=None):
+    if username is None:
+        conn.execute("DELETE FROM user_stats")
+        cursor = conn.execute(
+            "SELECT username, amount, timestamp FROM transactions "
+            "ORDER BY username, id"
+        )
+    else:
+        conn.execute("DELETE FROM user_stats WHERE username = ?", (username,))
+        cursor = conn.execute(
+            "SELECT username, amount, timestamp FROM transactions "
+            "WHERE username = ? ORDER BY id",
+            (username,)
+        )
+
+    # Stream in chunks so a full backfill never holds every row in memory
+    current, stats = None, None
+    while True:
+        chunk = cursor.fetchmany(10000)
+        if not chunk:
+            break
+        for user, rows in _group_consecutive(chunk):
+            if user != current:
+                if current is not None:
+                    conn.execute(SQL_UPSERT_STATS, (current,) + stats)
+                current, stats = user, None
+            stats = _merge_stats(stats, rows)
+
+    if current is not None:
+        conn.execute(SQL_UPSERT_STATS, (current,) + stats)
+
+
+def _group_consecutive(rows):
+    start = 0
+    for i in range(1, len(rows) + 1):
+        if i == len(rows) or rows[i][0] != rows[start][0]:
+            yield rows[start][0], rows[start:i]
+            start = i
+
+
+def rebuild_user_stats(username=None):
+    # Recompute statistics from the transactions table (all users by default)
+    if username is not None:
+        username = username.lower().strip()
+
+    with connection() as conn:
+        with conn:
+            _rebuild_user_stats(conn, username)
+
+
+@timed("db.user_stats")
+def get_user_stats(username, exclude_last=False):
+    # Returns None for users with no transactions. With exclude_last, count,
+    # total, mean and std describe the history before the latest
+    # transaction (the baseline it is scored against); min/max always cover
+    # the full history.
     username = username.lower().strip()
 
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+    with connection() as conn:
+        row = conn.execute(SQL_SELECT_STATS, (username,)).fetchone()
 
-    cursor.execute(
-        "INSERT INTO transactions (username, amount, timestamp) VALUES (?, ?, ?)",
-        (username, float(amount), datetime.now().isoformat())
-    )
+    if row is None:
+        return None
+
+    count, total, mean, m2, low, high, last_amount, last_timestamp = row
+
+    if exclude_last:
+        if count == 1:
+            count, total, mean, m2 = 0, 0.0, 0.0, 0.0
+        else:
+            prev_mean = (count * mean - last_amount) / (count - 1)
+            m2 = m2 - (last_amount - prev_mean) * (last_amount - mean)
+            # Cancellation noise must not turn a flat history into std ~1e-9
+            if m2 < 1e-9 * max(1.0, prev_mean * prev_mean) * count:
+                m2 = 0.0
+            count, total, mean = count - 1, total - last_amount, prev_mean
+
+    return {
+        "count": count,
+        "total": total,
+        "mean": mean,
+        "std": math.sqrt(max(m2, 0.0) / count) if count else 0.0,
+        "min": low,
+        "max": high,
+        "last_amount": last_amount,
+        "last_timestamp": last_timestamp,
+    }
+
+
+# ---------------- ROLLUPS ----------------
+def _update_rollups(conn, after_id=0):
+    # Folds transactions with id > after_id (the batch just written, inside
+    # the same transaction) into every grain, per user and for ALL_USERS.
+    # Aggregation happens in SQLite: one upsert per grain and scope.
+    for grain in ROLLUP_GRAINS:
+        params = {
+            "grain": grain,
+            "prefix": BUCKET_PREFIX[grain],
+            "threshold": HIGH_RISK_AMOUNT,
+            "after_id": after_id,
+            "everyone": ALL_USERS,
+        }
+        conn.execute(SQL_UPDATE_ROLLUPS_USER, params)
+        conn.execute(SQL_UPDATE_ROLLUPS_ALL, params)
+
+
+def _rebuild_rollups(conn):
+    conn.execute("DELETE FROM transaction_rollups")
+    _update_rollups(conn)
+
+
+def rebuild_rollups():
+    # Recompute every rollup from the transactions table
+    with connection() as conn:
+        with conn:
+            _rebuild_rollups(conn)
+
+
+# ---------------- GROUP COMMIT WRITER ----------------
+_STOP = object()
+
+
+class TransactionWriter:
+    # Background thread that coalesces inserts from many sessions into one
+    # transaction every GROUP_COMMIT_ROWS rows or GROUP_COMMIT_DELAY_MS.
+    # Its connection runs with synchronous=FULL, so a resolved future means
+    # the row is durable on disk, at the cost of one fsync per batch.
+
+    def __init__(self, path, max_rows=GROUP_COMMIT_ROWS,
+                 max_delay_ms=GROUP_COMMIT_DELAY_MS):
+        self.path = path
+        self.max_rows = max_rows
+        self.max_delay = max_delay_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, name="transaction-writer", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, username, amount, timestamp=None):
+        future = Future()
+        self._queue.put((_transaction_row(username, amount, timestamp), future))
+        return future
+
+    def flush(self, timeout=None):
+        # Resolves once everything queued before this call is committed
+        future = Future()
+        self._queue.put((None, future))
+        return future.result(timeout)
+
+    def stop(self, timeout=None):
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _run(self):
+        conn = open_connection(self.path)
+        conn.execute("PRAGMA synchronous=FULL")
+
+        try:
+            stopping = False
+            while not stopping:
+                item = self._queue.get()
+                if item is _STOP:
+                    break
+
+                batch = [item]
+                deadline = time.monotonic() + self.max_delay
 
-    conn.commit()
-    conn.close()
+                while len(batch) < self.max_rows:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+
+                self._commit(conn, batch)
+
+            # Flush whatever arrived before shutdown
+            leftovers = []
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not _STOP:
+                    leftovers.append(item)
+            if leftovers:
+                self._commit(conn, leftovers)
+        finally:
+            conn.close()
+
+    @timed("db.group_commit")
+    def _commit(self, conn, batch):
+        rows = [row for row, _ in batch if row is not None]
+        try:
+            if rows:
+                with conn:
+                    _write_transactions(conn, rows)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for _, future in batch:
+            future.set_result(None)
+        if rows:
+            _notify_written(rows)
+
+
+_writers = {}
+
+
+def get_writer():
+    writer = _writers.get(DB_NAME)
+    if writer is None:
+        with _pools_lock:
+            writer = _writers.get(DB_NAME)
+            if writer is None:
+                writer = _writers[DB_NAME] = TransactionWriter(DB_NAME)
+    return writer
+
+
+def enqueue_transaction(username, amount, timestamp=None):
+    # Returns a Future; call .result() to wait until the row is durable
+    return get_writer().submit(username, amount, timestamp)
+
+
+def flush_transactions(timeout=None):
+    writer = _writers.get(DB_NAME)
+    if writer is not None:
+        writer.flush(timeout)
+
+
+@atexit.register
+def stop_writers():
+    with _pools_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.stop()
 
 
 # ---------------- GET USER TRANSACTIONS ----------------
+@timed("db.user_transactions")
 def get_user_transactions(username):
     username = username.lower().strip()
 
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+    with connection() as conn:
+        rows = conn.execute(SQL_SELECT_AMOUNTS, (username,)).fetchall()
+
+    return [row[0] for row in rows]
+
+
+# ---------------- HISTORY QUERIES ----------------
+def _as_timestamp(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def get_last_transactions(username, n=10):
+    # Most recent n amounts, newest first
+    username = username.lower().strip()
+
+    with connection() as conn:
+        rows = conn.execute(SQL_SELECT_LAST_AMOUNTS, (username, n)).fetchall()
+
+    return [row[0] for row in rows]
+
+
+def get_transactions_page(username, after_id=0, before_id=None, limit=100):
+    # Keyset pagination: pass the last id of one page as after_id of the next.
+    # Returns (id, amount, timestamp) rows in ascending id order.
+    username = username.lower().strip()
+    if before_id is None:
+        before_id = 2 ** 63 - 1
+
+    with connection() as conn:
+        return conn.execute(
+            SQL_SELECT_PAGE, (username, after_id, before_id, limit)
+        ).fetchall()
+
+
+def get_transactions_between(username, start, end):
+    # (id, amount, timestamp) rows with start <= timestamp < end
+    username = username.lower().strip()
+
+    with connection() as conn:
+        return conn.execute(
+            SQL_SELECT_BETWEEN,
+            (username, _as_timestamp(start), _as_timestamp(end))
+        ).fetchall()
+
+
+def iter_user_transactions(username, batch_size=1000):
+    # Streams (id, amount, timestamp) rows page by page; no connection is
+    # held between batches, so slow consumers don't pin the pool.
+    after_id = 0
+    while True:
+        rows = get_transactions_page(username, after_id, limit=batch_size)
+        yield from rows
+        if len(rows) < batch_size:
+            return
+        after_id = rows[-1][0]
+
+
+# ---------------- ANALYTICS ----------------
+# Range queries are answered from rollups: the coarsest whole buckets inside
+# the range, finer buckets toward its edges, and raw rows only for the
+# sub-minute remainder, so results are exact at any range.
+def _analytics_args(username, start, end):
+    # start/end: datetime or ISO string, None for unbounded
+    args = (
+        _as_timestamp(start) if start is not None else "",
+        _as_timestamp(end) if end is not None else "\uffff",
+    )
+    if username is None:
+        return args
+    return (username.lower().strip(),) + args
+
+
+def _as_datetime(value):
+    return None if value is None else datetime.fromisoformat(_as_timestamp(value))
+
+
+def _bucket_floor(value, grain):
+    if grain == "day":
+        return value.replace(hour=0, minute=0, second=0, microsecond=0)
+    if grain == "hour":
+        return value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(second=0, microsecond=0)
+
+
+def _bucket_key(value, grain):
+    return None if value is None else value.isoformat()[:BUCKET_PREFIX[grain]]
+
+
+def _cover(start, end, level=0):
+    # Splits [start, end) into (grain, lo, hi) pieces, coarsest first;
+    # grain None means raw rows. None bounds are open-ended.
+    if level == len(ROLLUP_GRAINS):
+        return [(None, start, end)]
+
+    grain = ROLLUP_GRAINS[level]
+    lo = None
+    if start is not None:
+        lo = _bucket_floor(start, grain)
+        if lo < start:
+            lo += BUCKET_WIDTH[grain]
+    hi = None if end is None else _bucket_floor(end, grain)
+
+    if lo is not None and hi is not None and lo >= hi:
+        return _cover(start, end, level + 1)
+
+    pieces = [(grain, lo, hi)]
+    if start is not None and start < lo:
+        pieces += _cover(start, lo, level + 1)
+    if end is not None and hi < end:
+        pieces += _cover(hi, end, level + 1)
+    return pieces
+
+
+def _summarize(conn, username, start, end, threshold):
+    # (count, total, min, max, high_risk) over start <= timestamp < end
+    raw_sql = SQL_SUMMARY.format(where=_ANALYTICS_WHERE[username is not None])
+    if threshold != HIGH_RISK_AMOUNT:
+        # Rollups only count the standard threshold; scan instead
+        return conn.execute(
+            raw_sql, (threshold,) + _analytics_args(username, start, end)
+        ).fetchone()
+
+    user = ALL_USERS if username is None else username.lower().strip()
+    parts = []
+    for grain, lo, hi in _cover(start, end):
+        if grain is None:
+            parts.append(conn.execute(
+                raw_sql, (threshold,) + _analytics_args(username, lo, hi)
+            ).fetchone())
+        else:
+            parts.append(conn.execute(
+                SQL_ROLLUP_RANGE,
+                (grain, user) + _analytics_args(
+                    None, _bucket_key(lo, grain), _bucket_key(hi, grain)
+                )
+            ).fetchone())
+
+    lows = [p[2] for p in parts if p[2] is not None]
+    highs = [p[3] for p in parts if p[3] is not None]
+    return (
+        int(sum(p[0] for p in parts)),
+        sum(p[1] for p in parts),
+        min(lows) if lows else None,
+        max(highs) if highs else None,
+        sum(p[4] for p in parts),
+    )
+
+
+@timed("db.analytics_summary")
+def get_transaction_summary(username=None, start=None, end=None,
+                            threshold=HIGH_RISK_AMOUNT):
+    # Aggregates over start <= timestamp < end, for one user or everyone
+    with connection() as conn:
+        count, total, low, high, high_risk = _summarize(
+            conn, username, _as_datetime(start), _as_datetime(end), threshold
+        )
+
+    return {
+        "count": count,
+        "total": total,
+        "mean": total / count if count else 0.0,
+        "min": low,
+        "max": high,
+        "high_risk": int(high_risk),
+    }
+
+
+@timed("db.analytics_series")
+def get_transaction_series(username=None, start=None, end=None,
+                           bucket="day", threshold=HIGH_RISK_AMOUNT):
+    # (bucket, count, total, min, max, high_risk) rows per minute/hour/day,
+    # bucket being the timestamp prefix ("2024-01-31", "2024-01-31T09", ...).
+    # Buckets cut by start/end only count rows inside the range.
+    if threshold != HIGH_RISK_AMOUNT:
+        sql = SQL_SERIES.format(where=_ANALYTICS_WHERE[username is not None])
+        with connection() as conn:
+            return conn.execute(
+                sql,
+                (BUCKET_PREFIX[bucket], threshold)
+                + _analytics_args(username, start, end)
+            ).fetchall()
+
+    user = ALL_USERS if username is None else username.lower().strip()
+    start, end = _as_datetime(start), _as_datetime(end)
+    first = None if start is None else _bucket_floor(start, bucket)
+    last = None if end is None else _bucket_floor(end, bucket)
+    width = BUCKET_WIDTH[bucket]
+
+    # Partial buckets at either end -> (lo, hi) of the part inside the range
+    edges = {}
+    if start is not None and first < start:
+        hi = first + width if end is None else min(first + width, end)
+        edges[_bucket_key(first, bucket)] = (start, hi)
+    if end is not None and last < end:
+        lo = last if start is None else max(last, start)
+        edges[_bucket_key(last, bucket)] = (lo, end)
+
+    with connection() as conn:
+        rows = conn.execute(
+            SQL_ROLLUP_SERIES,
+            (bucket, user) + _analytics_args(
+                None, _bucket_key(first, bucket), _bucket_key(last, bucket)
+            )
+        ).fetchall()
+        rows = [row for row in rows if row[0] not in edges]
+        for key, (lo, hi) in edges.items():
+            rows.append((key,) + tuple(_summarize(conn, username, lo, hi, threshold)))
+
+    return sorted(row for row in rows if row[1])
+
+
+# ---------------- COMMAND LINE ----------------
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Artha AI database tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = commands.add_parser(
+        "rebuild-stats", help="backfill user_stats from the transactions table"
+    )
+    rebuild.add_argument("--user", help="only rebuild this user")
+    rebuild.add_argument("--db", default=DB_NAME, help="database file")
 
-    cursor.execute(
-        "SELECT amount FROM transactions WHERE username = ? ORDER BY id ASC",
-        (username,)
+    rollups = commands.add_parser(
+        "rebuild-rollups", help="recompute minute/hour/day transaction rollups"
     )
+    rollups.add_argument("--db", default=DB_NAME, help="database file")
 
-    rows = cursor.fetchall()
-    conn.close()
+    args = parser.parse_args()
 
-    return [row[0] for row in rows]
\ No newline at end of file
+    DB_NAME = args.db
+    init_db()
+    if args.command == "rebuild-rollups":
+        rebuild_rollups()
+        print("transaction_rollups rebuilt", file=sys.stderr)
+    else:
+        rebuild_user_stats(args.user)
+        print("user_stats rebuilt", file=sys.stderr)
@@ -0,0 +1,296 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from database import ConnectionPool, connection, init_db
+from market_data import get_store, COLUMNS
+
+# ---------------- FEATURE SETTINGS ----------------
+VOL_WINDOW = 5                # bars in the rolling return volatility
+ROLLING_WINDOW = 10           # prior transactions in the rolling amount stats
+
+BAR_FEATURES = ["Return", "Volatility"]
+TRANSACTION_FEATURES = [
+    "id", "timestamp", "amount", "count", "mean", "std",
+    "deviation", "rolling_mean", "rolling_std",
+]
+
+SQL_LAST_BAR_FEATURE = (
+    "SELECT ts, close FROM bar_features "
+    "WHERE symbol = ? AND interval = ? ORDER BY ts DESC LIMIT 1"
+)
+SQL_BAR_RANGE = (
+    "SELECT MIN(ts), MAX(ts) FROM bars WHERE symbol = ? AND interval = ?"
+)
+SQL_FIRST_BAR_FEATURE = (
+    "SELECT MIN(ts) FROM bar_features WHERE symbol = ? AND interval = ?"
+)
+SQL_BARS_BEFORE = (
+    "SELECT ts, close FROM bars WHERE symbol = ? AND interval = ? AND ts < ? "
+    "ORDER BY ts DESC LIMIT ?"
+)
+SQL_BARS_FROM = (
+    "SELECT ts, close FROM bars WHERE symbol = ? AND interval = ? AND ts >= ? "
+    "ORDER BY ts"
+)
+SQL_UPSERT_BAR_FEATURES = (
+    "INSERT OR REPLACE INTO bar_features VALUES (?, ?, ?, ?, ?, ?)"
+)
+SQL_SELECT_BAR_FEATURES = (
+    "SELECT b.ts, b.open, b.high, b.low, b.close, b.volume, f.ret, f.volatility "
+    "FROM bars b JOIN bar_features f USING (symbol, interval, ts) "
+    "WHERE b.symbol = ? AND b.interval = ? AND b.ts >= ? ORDER BY b.ts"
+)
+
+SQL_LAST_TXN_FEATURE = (
+    "SELECT id, amount, count, mean, m2 FROM transaction_features "
+    "WHERE username = ? ORDER BY id DESC LIMIT 1"
+)
+SQL_AMOUNTS_UP_TO = (
+    "SELECT amount FROM transactions WHERE username = ? AND id <= ? "
+    "ORDER BY id DESC LIMIT ?"
+)
+SQL_TRANSACTIONS_AFTER = (
+    "SELECT id, timestamp, amount FROM transactions "
+    "WHERE username = ? AND id > ? ORDER BY id"
+)
+SQL_UPSERT_TXN_FEATURES = (
+    "INSERT OR REPLACE INTO transaction_features (id, username, timestamp, "
+    "amount, count, mean, m2, std, deviation, rolling_mean, rolling_std) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+SQL_SELECT_TXN_FEATURES = (
+    "SELECT * FROM (SELECT id, timestamp, amount, count, mean, std, "
+    "deviation, rolling_mean, rolling_std FROM transaction_features "
+    "WHERE username = ? ORDER BY id DESC LIMIT ?) ORDER BY id"
+)
+
+
+def _nullable(values):
+    # NaN -> NULL for SQLite
+    return [None if v != v else v for v in values]
+
+
+# ---------------- FEATURE COMPUTATION ----------------
+def bar_features(closes, window=VOL_WINDOW):
+    # Same definitions the Prediction Lab used inline:
+    # Return = close.pct_change(), Volatility = Return.rolling(window).std()
+    returns = pd.Series(np.asarray(closes, dtype=float)).pct_change()
+    volatility = returns.rolling(window).std()
+    return returns.to_numpy(), volatility.to_numpy()
+
+
+def transaction_features(amounts, count=0, mean=0.0, m2=0.0, prior=(),
+                         window=ROLLING_WINDOW):
+    # Baseline features for each new amount, measured against everything
+    # before it. (count, mean, m2) are the running statistics of the
+    # history preceding `amounts`; `prior` is its last `window` amounts.
+    amounts = np.asarray(amounts, dtype=float)
+    k = len(amounts)
+
+    # Shifted exclusive cumulative sums: with the shift at the current mean
+    # the carried m2 needs no correction and cancellation stays small
+    shift = mean if count else (amounts[0] if k else 0.0)
+    d = amounts - shift
+    s = np.concatenate([[0.0], np.cumsum(d)[:-1]])
+    q = m2 + np.concatenate([[0.0], np.cumsum(d * d)[:-1]])
+    n = count + np.arange(k)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means = np.where(n > 0, shift + s / n, np.nan)
+        m2s = np.where(n > 0, np.maximum(q - s * s / n, 0.0), 0.0)
+        stds = np.where(n > 0, np.sqrt(m2s / n), np.nan)
+        # Zero spread counts as 1, as in the risk engine
+        deviation = np.abs(amounts - means) / np.where(stds == 0, 1.0, stds)
+
+    history = pd.Series(np.concatenate([np.asarray(prior, dtype=float), amounts]))
+    rolling = history.rolling(window, min_periods=1)
+    rolling_mean = rolling.mean().shift(1).to_numpy()[-k:] if k else np.empty(0)
+    rolling_std = rolling.std().shift(1).to_numpy()[-k:] if k else np.empty(0)
+
+    return {
+        "count": n,
+        "mean": means,
+        "m2": m2s,
+        "std": stds,
+        "deviation": deviation,
+        "rolling_mean": rolling_mean,
+        "rolling_std": rolling_std,
+    }
+
+
+# ---------------- FEATURE STORE ----------------
+class FeatureStore:
+    # Rolling features computed once per new bar / transaction and persisted
+    # next to the data they come from: bar features in the market data
+    # database, transaction features in fintech.db. Each read first catches
+    # up on rows added since the last one featured, so a render costs a
+    # tail update plus one indexed read, never a full-window recompute.
+
+    def __init__(self, market=None):
+        self.market = market or get_store()
+        self._pool = ConnectionPool(self.market.path)
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+        with self._pool.connection() as conn:
+            with conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS bar_features (
+                        symbol TEXT NOT NULL,
+                        interval TEXT NOT NULL,
+                        ts INTEGER NOT NULL,
+                        close REAL,
+                        ret REAL,
+                        volatility REAL,
+                        PRIMARY KEY (symbol, interval, ts)
+                    ) WITHOUT ROWID
+                """)
+
+    # ----- market bars -----
+    def symbol_features(self, symbol, interval, period):
+        # OHLCV bars plus Return / Volatility columns, indexed like get_bars
+        self.market.ensure(symbol, interval, period)
+        self.update_symbol(symbol, interval)
+
+        window = self.market.window(symbol, interval, period)
+        if window is None:
+            return pd.DataFrame(columns=COLUMNS + BAR_FEATURES)
+        start, tz = window
+
+        with self._pool.connection() as conn:
+            rows = conn.execute(
+                SQL_SELECT_BAR_FEATURES, (symbol, interval, start)
+            ).fetchall()
+
+        data = pd.DataFrame(rows, columns=["ts"] + COLUMNS + BAR_FEATURES)
+        data[BAR_FEATURES] = data[BAR_FEATURES].astype(float)
+        index = pd.to_datetime(data.pop("ts"), unit="s", utc=True).dt.tz_convert(tz)
+        data.index = pd.DatetimeIndex(index, name="Datetime")
+        return data
+
+    def update_symbol(self, symbol, interval):
+        # Features for bars newer than the last featured one. That bar is
+        # recomputed too, since a refresh may have replaced a partial bar.
+        # Returns the number of rows written.
+        key = (symbol, interval)
+        with self._lock_for(("bars",) + key), self._pool.connection() as conn:
+            first_bar, last_bar = conn.execute(SQL_BAR_RANGE, key).fetchone()
+            if last_bar is None:
+                return 0
+
+            last = conn.execute(SQL_LAST_BAR_FEATURE, key).fetchone()
+            first = conn.execute(SQL_FIRST_BAR_FEATURE, key).fetchone()[0]
+
+            if last is None or first_bar < first:
+                # Nothing featured yet, or older bars were backfilled
+                lookback, start = [], first_bar
+            else:
+                last_ts, last_close = last
+                if last_ts == last_bar:
+                    current = conn.execute(
+                        SQL_BARS_FROM, key + (last_ts,)
+                    ).fetchone()
+                    if current is not None and current[1] == last_close:
+                        return 0
+                lookback = conn.execute(
+                    SQL_BARS_BEFORE, key + (last_ts, VOL_WINDOW)
+                ).fetchall()[::-1]
+                start = last_ts
+
+            fresh = conn.execute(SQL_BARS_FROM, key + (start,)).fetchall()
+            rows = lookback + fresh
+            returns, volatility = bar_features([r[1] for r in rows])
+
+            skip = len(lookback)
+            with conn:
+                conn.executemany(SQL_UPSERT_BAR_FEATURES, [
+                    (symbol, interval, ts, close, *_nullable((ret, vol)))
+                    for (ts, close), ret, vol in zip(
+                        fresh, returns[skip:].tolist(), volatility[skip:].tolist()
+                    )
+                ])
+            return len(fresh)
+
+    # ----- transactions -----
+    def user_features(self, username, limit=None):
+        # Per-transaction features for a user, oldest first; `limit` keeps
+        # only the most recent rows
+        username = username.lower().strip()
+        self.update_user(username)
+
+        with connection() as conn:
+            rows = conn.execute(
+                SQL_SELECT_TXN_FEATURES, (username, -1 if limit is None else limit)
+            ).fetchall()
+
+        data = pd.DataFrame(rows, columns=TRANSACTION_FEATURES)
+        float_columns = TRANSACTION_FEATURES[4:]
+        data[float_columns] = data[float_columns].astype(float)
+        return data
+
+    def update_user(self, username):
+        # Features for transactions newer than the last featured one.
+        # Returns the number of rows written.
+        username = username.lower().strip()
+        init_db()
+
+        with self._lock_for(("user", username)), connection() as conn:
+            last = conn.execute(SQL_LAST_TXN_FEATURE, (username,)).fetchone()
+            after_id = last[0] if last else 0
+
+            fresh = conn.execute(
+                SQL_TRANSACTIONS_AFTER, (username, after_id)
+            ).fetchall()
+            if not fresh:
+                return 0
+
+            count, mean, m2 = 0, 0.0, 0.0
+            prior = []
+            if last is not None:
+                # Stored rows hold the baseline before their own amount;
+                # fold that amount in to get the state after it
+                _, amount, count, mean, m2 = last
+                mean = mean if count else 0.0
+                count += 1
+                delta = amount - mean
+                mean += delta / count
+                m2 += delta * (amount - mean)
+
+                prior = [r[0] for r in conn.execute(
+                    SQL_AMOUNTS_UP_TO, (username, after_id, ROLLING_WINDOW)
+                ).fetchall()[::-1]]
+
+            features = transaction_features(
+                [r[2] for r in fresh], count, mean, m2, prior
+            )
+            columns = [
+                features[name].tolist()
+                for name in ("count", "mean", "m2", "std", "deviation",
+                             "rolling_mean", "rolling_std")
+            ]
+
+            with conn:
+                conn.executemany(SQL_UPSERT_TXN_FEATURES, [
+                    (txn_id, username, timestamp, amount, n, *_nullable(values))
+                    for (txn_id, timestamp, amount), n, *values in zip(fresh, *columns)
+                ])
+            return len(fresh)
+
+    def _lock_for(self, key):
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+
+_feature_store = None
+_feature_store_lock = threading.Lock()
+
+
+def get_feature_store():
+    global _feature_store
+    if _feature_store is None:
+        with _feature_store_lock:
+            if _feature_store is None:
+                _feature_store = FeatureStore()
+    return _feature_store
@@ -0,0 +1,315 @@
+import os
+import re
+import time
+import threading
+
+import pandas as pd
+
+from database import ConnectionPool
+from metrics import timed
+
+MARKET_DB = "market_data.db"
+
+# ARTHA_MARKET_OFFLINE=1 serves only what is already stored.
+# ARTHA_MARKET_REPLAY_DIR=<dir> replaces yfinance with CSV files from <dir>.
+OFFLINE = os.environ.get("ARTHA_MARKET_OFFLINE", "") not in ("", "0")
+REPLAY_DIR = os.environ.get("ARTHA_MARKET_REPLAY_DIR")
+
+COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+INTERVAL_SECONDS = {
+    "1m": 60, "2m": 120, "5m": 300, "15m": 900, "30m": 1800,
+    "60m": 3600, "90m": 5400, "1h": 3600,
+    "1d": 86400, "5d": 5 * 86400, "1wk": 7 * 86400,
+}
+
+
+def period_days(period):
+    match = re.fullmatch(r"(\d+)(d|wk|mo|y)", period)
+    if match is None:
+        raise ValueError(f"Unsupported period: {period}")
+    n, unit = int(match.group(1)), match.group(2)
+    return n * {"d": 1, "wk": 7, "mo": 31, "y": 366}[unit]
+
+
+def normalize_frame(data):
+    # yfinance returns MultiIndex columns for some calls; keep one flat
+    # OHLCV frame with a tz-aware DatetimeIndex
+    if data is None or data.empty:
+        return pd.DataFrame(columns=COLUMNS)
+
+    if hasattr(data.columns, "levels"):
+        data = data.copy()
+        data.columns = data.columns.get_level_values(0)
+
+    data = data.reindex(columns=COLUMNS)
+    data["Volume"] = data["Volume"].fillna(0)
+    data = data.dropna()
+    if data.index.tz is None:
+        data.index = data.index.tz_localize("UTC")
+    return data.astype(float)
+
+
+# ---------------- DATA SOURCES ----------------
+class YFinanceSource:
+
+    @timed("market.fetch")
+    def fetch(self, symbol, interval, period=None, start=None):
+        import yfinance as yf
+
+        data = yf.download(
+            symbol,
+            period=None if start is not None else period,
+            start=start,
+            interval=interval,
+            progress=False,
+            auto_adjust=False
+        )
+        return normalize_frame(data)
+
+    @timed("market.fetch_many")
+    def fetch_many(self, symbols, interval, period=None, start=None):
+        # One batched request for all symbols
+        import yfinance as yf
+
+        data = yf.download(
+            list(symbols),
+            period=None if start is not None else period,
+            start=start,
+            interval=interval,
+            progress=False,
+            auto_adjust=False,
+            group_by="ticker"
+        )
+
+        frames = {}
+        for symbol in symbols:
+            if hasattr(data.columns, "levels") and symbol in data.columns.get_level_values(0):
+                frames[symbol] = normalize_frame(data[symbol])
+            else:
+                frames[symbol] = normalize_frame(None)
+        return frames
+
+
+class ReplaySource:
+    # Reads <directory>/<symbol>_<interval>.csv (Datetime index + OHLCV
+    # columns) so pages and tests run without network access.
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def fetch(self, symbol, interval, period=None, start=None):
+        path = os.path.join(self.directory, f"{symbol}_{interval}.csv")
+        if not os.path.exists(path):
+            return normalize_frame(None)
+
+        data = pd.read_csv(path, index_col=0)
+        data.index = pd.to_datetime(data.index, utc=True)
+        data = normalize_frame(data)
+
+        if start is not None:
+            data = data[data.index >= pd.Timestamp(start)]
+        elif period is not None and len(data):
+            data = data[data.index >= data.index[-1] - pd.Timedelta(days=period_days(period))]
+        return data
+
+    def fetch_many(self, symbols, interval, period=None, start=None):
+        return {s: self.fetch(s, interval, period, start) for s in symbols}
+
+
+def default_source():
+    return ReplaySource(REPLAY_DIR) if REPLAY_DIR else YFinanceSource()
+
+
+# ---------------- MARKET DATA STORE ----------------
+class MarketDataStore:
+    # Local OHLCV cache keyed by (symbol, interval). Reads are served from
+    # SQLite; the source is only asked for bars newer than the last one
+    # stored, at most once per bar interval.
+
+    def __init__(self, path=MARKET_DB, source=None, offline=OFFLINE):
+        self.path = path
+        self.source = source or default_source()
+        self.offline = offline
+        self._pool = ConnectionPool(path)
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+        with self._pool.connection() as conn:
+            with conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS bars (
+                        symbol TEXT NOT NULL,
+                        interval TEXT NOT NULL,
+                        ts INTEGER NOT NULL,
+                        open REAL, high REAL, low REAL, close REAL, volume REAL,
+                        PRIMARY KEY (symbol, interval, ts)
+                    ) WITHOUT ROWID
+                """)
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS series (
+                        symbol TEXT NOT NULL,
+                        interval TEXT NOT NULL,
+                        tz TEXT,
+                        period_days INTEGER NOT NULL,
+                        fetched_at REAL NOT NULL,
+                        PRIMARY KEY (symbol, interval)
+                    )
+                """)
+
+    def get_bars(self, symbol, interval, period):
+        self.ensure(symbol, interval, period)
+        return self.read(symbol, interval, period)
+
+    def ensure(self, symbol, interval, period):
+        # Refresh if due, without reading anything back
+        if not self.offline:
+            try:
+                self.refresh(symbol, interval, period)
+            except Exception:
+                # Serve the last stored bars if the source is unreachable
+                if self._last_ts(symbol, interval) is None:
+                    raise
+
+    def refresh(self, symbol, interval, period, force=False):
+        # One refresh per series at a time; other sessions read meanwhile
+        with self._lock_for(symbol, interval):
+            series = self._series(symbol, interval)
+            days = period_days(period)
+            now = time.time()
+
+            if series is not None and not force:
+                _, period_cached, fetched_at = series
+                fresh = now - fetched_at < INTERVAL_SECONDS.get(interval, 60)
+                if fresh and period_cached >= days:
+                    return 0
+
+            last_ts = self._last_ts(symbol, interval)
+            if series is None or last_ts is None or series[1] < days:
+                data = self.source.fetch(symbol, interval, period=period)
+            else:
+                # Re-fetch the last stored bar too: it may have been partial
+                start = pd.Timestamp(last_ts, unit="s", tz="UTC")
+                data = self.source.fetch(symbol, interval, start=start)
+
+            self.write(symbol, interval, data, max(days, series[1] if series else 0))
+            return len(data)
+
+    def refresh_many(self, symbols, interval, period):
+        # Batched refresh for a fixed symbol set (used by the shared poller).
+        # Starts from the oldest last-stored bar so every symbol catches up.
+        days = period_days(period)
+        last = [self._last_ts(s, interval) for s in symbols]
+        covered = all(
+            ts is not None and (self._series(s, interval) or (0, 0))[1] >= days
+            for s, ts in zip(symbols, last)
+        )
+
+        if covered:
+            start = pd.Timestamp(min(last), unit="s", tz="UTC")
+            frames = self.source.fetch_many(symbols, interval, start=start)
+        else:
+            frames = self.source.fetch_many(symbols, interval, period=period)
+
+        for symbol, data in frames.items():
+            self.write(symbol, interval, data, days)
+        return frames
+
+    def write(self, symbol, interval, data, days=0):
+        data = normalize_frame(data)
+        rows = [
+            (symbol, interval, int(ts.timestamp()), *values)
+            for ts, values in zip(data.index, data.itertuples(index=False))
+        ]
+        tz = str(data.index.tz) if len(data) else None
+
+        with self._pool.connection() as conn:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO bars VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                conn.execute(
+                    "INSERT INTO series VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (symbol, interval) DO UPDATE SET "
+                    "tz = COALESCE(excluded.tz, tz), "
+                    "period_days = MAX(period_days, excluded.period_days), "
+                    "fetched_at = excluded.fetched_at",
+                    (symbol, interval, tz, days, time.time())
+                )
+
+    def read(self, symbol, interval, period=None):
+        window = self.window(symbol, interval, period)
+        if window is None:
+            return pd.DataFrame(columns=COLUMNS)
+        start, tz = window
+
+        with self._pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT ts, open, high, low, close, volume FROM bars "
+                "WHERE symbol = ? AND interval = ? AND ts >= ? ORDER BY ts",
+                (symbol, interval, start)
+            ).fetchall()
+
+        data = pd.DataFrame(rows, columns=["ts"] + COLUMNS)
+        index = pd.to_datetime(data.pop("ts"), unit="s", utc=True).dt.tz_convert(tz)
+        data.index = pd.DatetimeIndex(index, name="Datetime")
+        return data
+
+    def window(self, symbol, interval, period=None):
+        # (first ts, display tz) of the bars `period` covers, counted back
+        # from the last stored bar; None when nothing is stored
+        last_ts = self._last_ts(symbol, interval)
+        if last_ts is None:
+            return None
+
+        series = self._series(symbol, interval)
+        tz = (series[0] if series else None) or "UTC"
+        if period is None:
+            return 0, tz
+
+        last = pd.Timestamp(last_ts, unit="s", tz="UTC").tz_convert(tz)
+        days = period_days(period)
+        if INTERVAL_SECONDS.get(interval, 86400) < 86400:
+            # Intraday: whole sessions, like yfinance's "1d" = today
+            begin = last.normalize() - pd.Timedelta(days=days - 1)
+        else:
+            begin = last - pd.Timedelta(days=days)
+        return int(begin.timestamp()), tz
+
+    def fetched_at(self, symbol, interval):
+        # When the series was last fetched from the source (epoch seconds)
+        series = self._series(symbol, interval)
+        return series[2] if series else None
+
+    def _series(self, symbol, interval):
+        with self._pool.connection() as conn:
+            return conn.execute(
+                "SELECT tz, period_days, fetched_at FROM series "
+                "WHERE symbol = ? AND interval = ?",
+                (symbol, interval)
+            ).fetchone()
+
+    def _last_ts(self, symbol, interval):
+        with self._pool.connection() as conn:
+            return conn.execute(
+                "SELECT MAX(ts) FROM bars WHERE symbol = ? AND interval = ?",
+                (symbol, interval)
+            ).fetchone()[0]
+
+    def _lock_for(self, symbol, interval):
+        with self._locks_guard:
+            return self._locks.setdefault((symbol, interval), threading.Lock())
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = MarketDataStore()
+    return _store
@@ -0,0 +1,97 @@
+import time
+import logging
+import threading
+from collections import namedtuple
+
+from market_data import get_store, INTERVAL_SECONDS
+from metrics import inc
+
+POLL_SECONDS = 60
+
+logger = logging.getLogger(__name__)
+
+Snapshot = namedtuple("Snapshot", ["symbol", "data", "updated_at"])
+
+
+# ---------------- SHARED MARKET POLLER ----------------
+class MarketPoller:
+    # One background thread per process refreshes a fixed symbol set with a
+    # single batched download and publishes the latest frames. Every
+    # Streamlit session reads the same published snapshot instead of
+    # downloading on its own.
+
+    def __init__(self, symbols, interval, period, poll_seconds=POLL_SECONDS,
+                 store=None):
+        self.symbols = list(symbols)
+        self.interval = interval
+        self.period = period
+        self.poll_seconds = poll_seconds
+        self.store = store or get_store()
+        # Snapshots older than this are flagged as stale to readers
+        self.max_age = 2 * max(poll_seconds, INTERVAL_SECONDS.get(interval, 60))
+
+        self.last_error = None
+        self.polls = 0
+        # Replaced wholesale on each poll, so readers never see a partial
+        # update and need no lock
+        self._snapshots = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name=f"market-poller-{interval}", daemon=True
+        )
+        self._thread.start()
+
+    def snapshot(self, symbol):
+        # Latest published frame for symbol, or None before the first poll
+        return self._snapshots.get(symbol)
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def poll_once(self):
+        try:
+            if not self.store.offline:
+                self.store.refresh_many(self.symbols, self.interval, self.period)
+            self.last_error = None
+        except Exception as e:
+            # Keep publishing whatever is stored; the page shows the age
+            self.last_error = e
+
+        published = dict(self._snapshots)
+        for symbol in self.symbols:
+            data = self.store.read(symbol, self.interval, self.period)
+            if len(data):
+                fetched_at = self.store.fetched_at(symbol, self.interval)
+                published[symbol] = Snapshot(symbol, data, fetched_at)
+        self._snapshots = published
+        self.polls += 1
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                self.poll_once()
+            except Exception as e:
+                # e.g. "database is locked" reading the store: keep the last
+                # snapshots and try again next poll rather than letting the
+                # thread die with every session left on stale data
+                self.last_error = e
+                inc("market.poll_errors")
+                logger.exception("market poll failed for %s", self.symbols)
+            self._stop.wait(max(0.0, self.poll_seconds - (time.monotonic() - started)))
+
+
+_pollers = {}
+_pollers_lock = threading.Lock()
+
+
+def get_poller(symbols, interval, period, poll_seconds=POLL_SECONDS):
+    key = (tuple(symbols), interval, period)
+    with _pollers_lock:
+        poller = _pollers.get(key)
+        if poller is None:
+            poller = _pollers[key] = MarketPoller(
+                symbols, interval, period, poll_seconds
+            )
+    return poller
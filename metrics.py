@@ -0,0 +1,280 @@
+import os
+import json
+import time
+import bisect
+import threading
+import functools
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ---------------- METRICS SETTINGS ----------------
+# ARTHA_METRICS_PORT=<port> serves Prometheus text on http://127.0.0.1:<port>/metrics
+# ARTHA_METRICS_FILE=<path> appends a JSON snapshot every METRICS_FLUSH_SECONDS
+METRICS_PORT = os.environ.get("ARTHA_METRICS_PORT")
+METRICS_FILE = os.environ.get("ARTHA_METRICS_FILE")
+METRICS_FLUSH_SECONDS = 60
+METRICS_PREFIX = "artha"
+
+# Histogram bucket upper bounds in seconds: 10 us to ~100 s, 25% apart, so
+# interpolated quantiles are within a few percent
+BUCKETS = tuple(1e-5 * 1.25 ** i for i in range(73))
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+# ---------------- METRIC TYPES ----------------
+class Counter:
+
+    def __init__(self, name):
+        self.name = name
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Histogram:
+    # Fixed log-spaced buckets: O(1) memory and O(log buckets) per
+    # observation, and mergeable/exportable as a Prometheus histogram.
+    # Quantiles are interpolated inside the bucket that holds them.
+
+    def __init__(self, name, buckets=BUCKETS):
+        self.name = name
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)      # last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def merge(self, counts, count, total, top):
+        # Folds in another histogram with the same buckets, e.g. one
+        # recorded in a worker process
+        with self._lock:
+            self.counts = [a + b for a, b in zip(self.counts, counts)]
+            self.count += count
+            self.sum += total
+            self.max = max(self.max, top)
+
+    def quantile(self, q):
+        with self._lock:
+            counts, count, top = list(self.counts), self.count, self.max
+        if count == 0:
+            return 0.0
+
+        rank = q * count
+        seen = 0
+        for i, n in enumerate(counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else top
+                return min(lower + (upper - lower) * (rank - seen) / n, top)
+            seen += n
+        return top
+
+    def summary(self):
+        with self._lock:
+            count, total, top = self.count, self.sum, self.max
+        result = {
+            "count": count,
+            "mean_ms": total / count * 1000 if count else 0.0,
+            "max_ms": top * 1000,
+        }
+        for q in QUANTILES:
+            result[f"p{int(q * 100)}_ms"] = self.quantile(q) * 1000
+        return result
+
+
+# ---------------- REGISTRY ----------------
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+
+def _get(name, kind):
+    metric = _metrics.get(name)
+    if metric is None:
+        with _metrics_lock:
+            metric = _metrics.get(name)
+            if metric is None:
+                metric = _metrics[name] = kind(name)
+    return metric
+
+
+def counter(name):
+    return _get(name, Counter)
+
+
+def histogram(name):
+    return _get(name, Histogram)
+
+
+def observe(name, seconds):
+    histogram(name).observe(seconds)
+
+
+def inc(name, amount=1):
+    counter(name).inc(amount)
+
+
+@contextmanager
+def timer(name):
+    # Records the block's wall time, also when it raises (st.stop() included)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram(name).observe(time.perf_counter() - started)
+
+
+def timed(name):
+    def decorator(fn):
+        hist = histogram(name)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                hist.observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+def snapshot():
+    # {"timers": {name: summary}, "counters": {name: value}}
+    with _metrics_lock:
+        metrics = list(_metrics.values())
+
+    return {
+        "timestamp": time.time(),
+        "timers": {
+            m.name: m.summary() for m in sorted(metrics, key=lambda m: m.name)
+            if isinstance(m, Histogram)
+        },
+        "counters": {
+            m.name: m.value for m in sorted(metrics, key=lambda m: m.name)
+            if isinstance(m, Counter)
+        },
+    }
+
+
+def histogram_state():
+    # Picklable {name: (counts, count, sum, max)} for merge_histograms()
+    with _metrics_lock:
+        metrics = [m for m in _metrics.values() if isinstance(m, Histogram)]
+
+    state = {}
+    for m in metrics:
+        with m._lock:
+            state[m.name] = (list(m.counts), m.count, m.sum, m.max)
+    return state
+
+
+def merge_histograms(state):
+    for name, (counts, count, total, top) in state.items():
+        histogram(name).merge(counts, count, total, top)
+
+
+def reset():
+    with _metrics_lock:
+        _metrics.clear()
+
+
+# ---------------- EXPORTERS ----------------
+def _prom_name(name):
+    return METRICS_PREFIX + "_" + "".join(c if c.isalnum() else "_" for c in name)
+
+
+def prometheus_text():
+    # Prometheus text exposition format (version 0.0.4)
+    with _metrics_lock:
+        metrics = sorted(_metrics.values(), key=lambda m: m.name)
+
+    lines = []
+    for m in metrics:
+        if isinstance(m, Counter):
+            name = _prom_name(m.name) + "_total"
+            lines += [f"# TYPE {name} counter", f"{name} {m.value}"]
+            continue
+
+        name = _prom_name(m.name) + "_seconds"
+        with m._lock:
+            counts, count, total = list(m.counts), m.count, m.sum
+        lines.append(f"# TYPE {name} histogram")
+        cumulative = 0
+        for bound, n in zip(m.buckets + (float("inf"),), counts):
+            cumulative += n
+            le = "+Inf" if bound == float("inf") else f"{bound:.6g}"
+            lines.append(f'{name}_bucket{{le="{le}"}} {cumulative}')
+        lines += [f"{name}_sum {total}", f"{name}_count {count}"]
+
+    return "\n".join(lines) + "\n"
+
+
+def write_jsonl(path=METRICS_FILE):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(snapshot()) + "\n")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+_exporters_started = False
+_exporters_lock = threading.Lock()
+
+
+def start_exporters(port=METRICS_PORT, path=METRICS_FILE):
+    # Once per process; each exporter only runs if configured
+    global _exporters_started
+    with _exporters_lock:
+        if _exporters_started:
+            return
+        _exporters_started = True
+
+    if port:
+        try:
+            server = ThreadingHTTPServer(("127.0.0.1", int(port)), _MetricsHandler)
+        except OSError:
+            # Another process (e.g. a second app instance) owns the port
+            server = None
+        if server is not None:
+            threading.Thread(
+                target=server.serve_forever, name="metrics-http", daemon=True
+            ).start()
+
+    if path:
+        def flush():
+            while True:
+                time.sleep(METRICS_FLUSH_SECONDS)
+                try:
+                    write_jsonl(path)
+                except OSError:
+                    pass
+
+        threading.Thread(target=flush, name="metrics-jsonl", daemon=True).start()
@@ -1,5 +1,39 @@
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import TimeoutError
+
 import numpy as np
 from sklearn.ensemble import IsolationForest
+from sklearn.linear_model import LinearRegression
+
+from model_store import get_model_store, data_hash, WARM_MODELS
+from metrics import timed, observe, inc
+
+# ---------------- MODEL CACHE SETTINGS ----------------
+MODEL_CACHE_SIZE = 256        # fitted models kept in memory (LRU)
+MODEL_TTL_SECONDS = 3600      # memory entries expire, disk copies remain
+RETRAIN_MIN_NEW = 20          # refit after this many new transactions ...
+DRIFT_THRESHOLD = 0.5         # ... or once mean/std move by half a std
+
+# ---------------- RISK FORMULA ----------------
+DEVIATION_WEIGHT = 15         # risk points per std of deviation ...
+BEHAVIORAL_CAP = 70           # ... capped here
+ANOMALY_WEIGHT = 10           # IsolationForest boost per unit of score ...
+ML_BOOST_CAP = 25             # ... capped here
+RISK_CAP = 95
+CONFIDENCE_PER_TXN = 12
+
+RISK_DTYPE = np.dtype([
+    ("username", object),
+    ("amount", np.float64),
+    ("prediction", np.int8),        # -1 anomaly, 1 normal, 0 no model
+    ("anomaly_score", np.float64),
+    ("deviation", np.float64),
+    ("risk_percent", np.int16),
+    ("confidence", np.int16),
+])
+
 
 def train_user_model(transaction_history):
 
@@ -14,12 +48,416 @@ def train_user_model(transaction_history):
     return model
 
 
+@timed("model.predict_user")
 def predict_user_risk(model, amount):
 
     if model is None:
         return None, 0
 
-    prediction = model.predict([[amount]])
-    score = model.decision_function([[amount]])
+    # IsolationForest.predict is decision_function < 0, so one pass does both
+    score = model.decision_function([[amount]])[0]
+    prediction = -1 if score < 0 else 1
+
+    return prediction, score
+
+
+# ---------------- COMPILED MODEL ----------------
+class CompiledIsolationForest:
+    # A single-feature IsolationForest is a step function of the amount:
+    # every tree splits on the same axis, so its score is constant between
+    # consecutive split thresholds. Evaluating the forest once at each
+    # threshold turns scoring into a binary search, which is orders of
+    # magnitude faster than walking 100 trees per call. Only the lookup
+    # tables are kept; the forest itself is dropped once they're built.
+
+    def __init__(self, model):
+        thresholds = np.unique(np.concatenate([
+            tree.tree_.threshold[tree.tree_.feature >= 0]
+            for tree in model.estimators_
+        ]))
+        # Trees compare float32 inputs with x <= t going left, so probe each
+        # interval (t[i-1], t[i]] at the largest float32 not above t[i]
+        probes = thresholds.astype(np.float32)
+        above = probes.astype(np.float64) > thresholds
+        probes[above] = np.nextafter(probes[above], np.float32(-np.inf))
+        probes = np.append(probes, np.finfo(np.float32).max)
+
+        self.thresholds = thresholds
+        self.scores = model.decision_function(probes.reshape(-1, 1))
+
+    def decision_function(self, X):
+        # Trees compare float32 inputs, so round the same way before lookup
+        x = np.asarray(X, dtype=np.float32).astype(np.float64).reshape(-1)
+        return self.scores[np.searchsorted(self.thresholds, x, side="left")]
+
+    def predict(self, X):
+        return np.where(self.decision_function(X) < 0, -1, 1)
+
+
+def compile_model(model):
+    return CompiledIsolationForest(model) if model is not None else None
+
+
+# ---------------- FIT JOBS ----------------
+# Top-level so they can run in a training worker process.
+def fit_user_model(history):
+    history = np.asarray(history, dtype=float)
+
+    started = time.perf_counter()
+    model = compile_model(train_user_model(history))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "model": model,
+        "mean": float(np.mean(history)) if len(history) else 0.0,
+        "std": float(np.std(history)) if len(history) else 0.0,
+        "rows": len(history),
+        "data_hash": data_hash(history),
+        "fit_seconds": elapsed,
+    }
+
+
+def train_price_model(X, y):
+    model = LinearRegression()
+    model.fit(X, y)
+    return model
+
+
+def fit_price_model(X, y):
+    started = time.perf_counter()
+    model = train_price_model(X, y)
+
+    return {
+        "model": model,
+        "rows": len(y),
+        "data_hash": data_hash(X, y),
+        "fit_seconds": time.perf_counter() - started,
+    }
+
+
+# ---------------- VECTORISED SCORING ----------------
+def behavioral_risk(amounts, mean, std):
+    # Returns (deviation score, behavioural risk points) for each amount
+    amounts = np.asarray(amounts, dtype=float)
+    std = np.where(np.asarray(std, dtype=float) == 0, 1.0, std)
+
+    deviation = np.abs(amounts - mean) / std
+    return deviation, np.minimum(BEHAVIORAL_CAP, deviation * DEVIATION_WEIGHT)
+
+
+def ml_boost(anomaly_scores):
+    anomaly_scores = np.asarray(anomaly_scores, dtype=float)
+    return np.where(
+        anomaly_scores < 0,
+        np.minimum(ML_BOOST_CAP, np.abs(anomaly_scores) * ANOMALY_WEIGHT),
+        0.0
+    )
+
+
+def combine_risk(behavioral, boost):
+    # Truncates like int() in the original per-transaction formula
+    return np.minimum(RISK_CAP, behavioral + boost).astype(np.int16)
+
+
+def score_batch(amounts_by_user, stats_by_user, models=None):
+    # amounts_by_user: {username: sequence of amounts to score}
+    # stats_by_user: {username: {"count", "mean", "std"}} baselines, e.g.
+    #   from database.get_user_stats
+    # models: {username: fitted IsolationForest or None}
+    # Returns a RISK_DTYPE structured array, one row per scored amount.
+    models = models or {}
+    total = sum(len(a) for a in amounts_by_user.values())
+    result = np.zeros(total, dtype=RISK_DTYPE)
+
+    offset = 0
+    for username, amounts in amounts_by_user.items():
+        amounts = np.asarray(amounts, dtype=float).reshape(-1)
+        rows = result[offset:offset + len(amounts)]
+        offset += len(amounts)
+        if not len(amounts):
+            continue
+
+        stats = stats_by_user.get(username) or {"count": 0, "mean": 0.0, "std": 0.0}
+        deviation, behavioral = behavioral_risk(amounts, stats["mean"], stats["std"])
+
+        model = models.get(username)
+        if model is not None:
+            scores = model.decision_function(amounts.reshape(-1, 1))
+            rows["prediction"] = np.where(scores < 0, -1, 1)
+            rows["anomaly_score"] = scores
+            boost = ml_boost(scores)
+        else:
+            boost = 0.0
+
+        rows["username"] = username
+        rows["amount"] = amounts
+        rows["deviation"] = deviation
+        rows["risk_percent"] = combine_risk(behavioral, boost)
+        rows["confidence"] = min(100, stats["count"] * CONFIDENCE_PER_TXN)
+
+    return result
+
+
+# ---------------- MODEL REGISTRY ----------------
+class ModelRegistry:
+    # Caches one fitted model per user, keyed by history version (the number
+    # of transactions it was trained on). Models live in an in-memory LRU
+    # backed by the versioned ModelStore, so restarts don't refit. A cached
+    # model is reused until RETRAIN_MIN_NEW transactions arrive or the
+    # user's amounts drift.
+
+    KIND = "user-model"
+
+    def __init__(self, store=None, max_size=MODEL_CACHE_SIZE,
+                 ttl=MODEL_TTL_SECONDS, min_new=RETRAIN_MIN_NEW,
+                 drift_threshold=DRIFT_THRESHOLD):
+        self.store = store or get_model_store()
+        self.max_size = max_size
+        self.ttl = ttl
+        self.min_new = min_new
+        self.drift_threshold = drift_threshold
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {
+            "hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "fits": 0,
+            "fit_seconds": 0.0,
+        }
+
+    def get(self, username, version, load_history, mean=None, std=None,
+            scheduler=None):
+        # version: transactions in the user's history right now.
+        # load_history: called only when a fit is needed.
+        # mean/std: current running stats, used for drift detection.
+        # scheduler: a training.TrainingScheduler; when given, stale models
+        #   are refit in a worker process and the previous model (or None)
+        #   is returned immediately instead of blocking on the fit.
+        entry = self._lookup(username)
+
+        if entry is not None and not self._stale(entry, version, mean, std):
+            with self._lock:
+                self.counters["hits"] += 1
+            inc("model.registry_hits")
+            return entry["model"]
+
+        with self._lock:
+            self.counters["misses"] += 1
+        inc("model.registry_misses")
+
+        if scheduler is None:
+            return self._finish_fit(
+                username, version, fit_user_model(load_history())
+            )
+
+        key = ("user-model", username)
+        if not scheduler.pending(key):
+            def finished(future):
+                if future.exception() is None:
+                    self._finish_fit(username, version, future.result())
+
+            scheduler.submit(key, fit_user_model, load_history()).add_done_callback(finished)
+
+        return entry["model"] if entry is not None else None
+
+    def _finish_fit(self, username, version, fitted):
+        entry = {
+            "model": fitted["model"],
+            "version": version,
+            "mean": fitted["mean"],
+            "std": fitted["std"],
+            "fitted_at": time.time(),
+        }
+
+        with self._lock:
+            self.counters["fits"] += 1
+            self.counters["fit_seconds"] += fitted["fit_seconds"]
+        # Fits usually run in a worker; record their time here
+        observe("model.fit_user", fitted["fit_seconds"])
+        self._store(username, entry)
+        self.store.save(
+            self.KIND,
+            username,
+            entry["model"],
+            rows=version,
+            data_hash=fitted.get("data_hash"),
+            fit_seconds=fitted["fit_seconds"],
+            mean=entry["mean"],
+            std=entry["std"]
+        )
+        return entry["model"]
+
+    def peek(self, username):
+        # Cached model without ever fitting (None if nothing is cached)
+        entry = self._lookup(username)
+        return entry["model"] if entry is not None else None
+
+    def invalidate(self, username):
+        with self._lock:
+            self._entries.pop(username, None)
+        self.store.delete(self.KIND, username)
+
+    def warm_up(self, limit=WARM_MODELS):
+        # Preloads the most recently used models into memory; returns how
+        # many were loaded
+        loaded = 0
+        for meta in self.store.hottest(self.KIND, limit):
+            if self._lookup(meta["key"]) is not None:
+                loaded += 1
+        return loaded
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+            counters["size"] = len(self._entries)
+        lookups = counters["hits"] + counters["misses"]
+        counters["hit_rate"] = counters["hits"] / lookups if lookups else 0.0
+        return counters
+
+    # ----- internals -----
+    def _stale(self, entry, version, mean, std):
+        if version < entry["version"]:
+            return True
+        if version - entry["version"] >= self.min_new:
+            return True
+        if version == entry["version"] or mean is None or std is None:
+            return False
+
+        scale = max(entry["std"], 1.0)
+        return (
+            abs(mean - entry["mean"]) > self.drift_threshold * scale
+            or abs(std - entry["std"]) > self.drift_threshold * scale
+        )
+
+    def _lookup(self, username):
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is not None:
+                if now - entry["cached_at"] <= self.ttl:
+                    self._entries.move_to_end(username)
+                    return entry
+                del self._entries[username]
+                self.counters["evictions"] += 1
+
+        entry = self._load(username)
+        if entry is not None:
+            with self._lock:
+                self.counters["disk_hits"] += 1
+            self._store(username, entry)
+        return entry
+
+    def _store(self, username, entry):
+        entry["cached_at"] = time.time()
+
+        with self._lock:
+            self._entries[username] = entry
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def _load(self, username):
+        loaded = self.store.load(self.KIND, username)
+        if loaded is None:
+            return None
+
+        model, meta = loaded
+        return {
+            "model": model,
+            "version": meta["rows"],
+            "mean": meta["mean"],
+            "std": meta["std"],
+            "fitted_at": meta["saved_at"],
+        }
+
+
+registry = ModelRegistry()
+
+
+def get_user_model(username, version, load_history, mean=None, std=None,
+                   scheduler=None):
+    return registry.get(username, version, load_history, mean, std, scheduler)
+
+
+# ---------------- PRICE MODELS ----------------
+PRICE_KIND = "price-model"
+
+
+def get_price_model(symbol, X, y, scheduler=None, timeout=None):
+    # Returns (model, fresh). A stored model fitted on exactly this data is
+    # served without refitting, across restarts too. Otherwise the stored
+    # model (if any) keeps serving while a refit runs on the scheduler; with
+    # nothing stored, waits up to `timeout` for the fit.
+    store = get_model_store()
+    X, y = np.asarray(X, dtype=float), np.asarray(y, dtype=float)
+    digest = data_hash(X, y)
+
+    loaded = store.load(PRICE_KIND, symbol)
+    if loaded is not None and loaded[1]["data_hash"] == digest:
+        return loaded[0], True
+
+    def save(fitted):
+        observe("model.fit_price", fitted["fit_seconds"])
+        store.save(
+            PRICE_KIND,
+            symbol,
+            fitted["model"],
+            rows=fitted["rows"],
+            data_hash=fitted["data_hash"],
+            fit_seconds=fitted["fit_seconds"]
+        )
+        return fitted["model"]
+
+    if scheduler is None:
+        return save(fit_price_model(X, y)), True
+
+    key = (PRICE_KIND, symbol, digest)
+    submitted = not scheduler.pending(key)
+    future = scheduler.submit(key, fit_price_model, X, y)
+    if submitted:
+        def finished(f):
+            if f.exception() is None:
+                save(f.result())
+
+        future.add_done_callback(finished)
+
+    if loaded is not None:
+        return loaded[0], False
+
+    try:
+        fitted = future.result(timeout)
+    except TimeoutError:
+        return None, False
+    # The done callback may not have run yet; saving twice is a no-op
+    return save(fitted), True
+
+
+# ---------------- WARM-UP ----------------
+_warmed = False
+_warm_lock = threading.Lock()
+
+
+def warm_up(limit=WARM_MODELS, background=True):
+    # Preloads the hottest stored models once per process so the first
+    # request after a deploy is served from memory, not a cold fit
+    global _warmed
+    with _warm_lock:
+        if _warmed:
+            return
+        _warmed = True
+
+    def run():
+        registry.warm_up(limit)
+        store = get_model_store()
+        for meta in store.hottest(PRICE_KIND, limit):
+            store.load(PRICE_KIND, meta["key"])
 
-    return prediction[0], score[0]
\ No newline at end of file
+    if background:
+        threading.Thread(target=run, name="model-warm-up", daemon=True).start()
+    else:
+        run()
@@ -0,0 +1,203 @@
+import os
+import json
+import time
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import sklearn
+
+# ---------------- MODEL STORE SETTINGS ----------------
+MODEL_DIR = "model_cache"
+KEEP_VERSIONS = 3             # artifacts kept per model; older ones pruned
+WARM_MODELS = 32              # most recently used models preloaded per kind
+LOADED_MODELS = 64            # unpickled artifacts kept in memory (LRU, all kinds)
+
+
+def data_hash(*arrays):
+    # Fingerprint of the training data a model was fitted on
+    digest = hashlib.sha1()
+    for array in arrays:
+        array = np.ascontiguousarray(array, dtype=float)
+        digest.update(str(array.shape).encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+# ---------------- MODEL STORE ----------------
+class ModelStore:
+    # Versioned model artifacts on disk:
+    #
+    #   <root>/<kind>/<sha1(key)>/<version>.pkl   pickled model
+    #   <root>/<kind>/<sha1(key)>/latest.json     metadata of newest version
+    #
+    # Metadata (training rows, data hash, fit time, library version, ...)
+    # is readable without unpickling. Artifacts are only unpickled on first
+    # use, then kept in a small LRU; callers with their own cache (e.g.
+    # ModelRegistry) bound their memory use themselves. The mtime of
+    # latest.json doubles as "last used", which is what warm-up ranks by.
+
+    def __init__(self, root=MODEL_DIR, keep=KEEP_VERSIONS,
+                 max_loaded=LOADED_MODELS):
+        self.root = root
+        self.keep = keep
+        self.max_loaded = max_loaded
+        self._loaded = OrderedDict()
+        self._lock = threading.Lock()
+
+    def save(self, kind, key, model, rows, data_hash=None, fit_seconds=None,
+             **extra):
+        # Writes a new version and returns its metadata. Saving data that
+        # matches the latest version's hash is a no-op.
+        latest = self.metadata(kind, key)
+        if latest is not None and data_hash is not None \
+                and latest["data_hash"] == data_hash:
+            return latest
+
+        meta = {
+            "kind": kind,
+            "key": key,
+            "version": latest["version"] + 1 if latest else 1,
+            "rows": int(rows),
+            "data_hash": data_hash,
+            "fit_seconds": fit_seconds,
+            "saved_at": time.time(),
+            "sklearn_version": sklearn.__version__,
+            **extra,
+        }
+
+        directory = self._dir(kind, key)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            self._write(
+                os.path.join(directory, f"{meta['version']}.pkl"),
+                pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)
+            )
+            # Pointer last, so readers never see metadata without its model
+            self._write(
+                os.path.join(directory, "latest.json"),
+                json.dumps(meta).encode()
+            )
+            self._prune(directory, meta["version"])
+        except OSError:
+            # The store is an optimisation; memory still has the model
+            pass
+
+        self._remember(kind, key, meta, model)
+        return meta
+
+    def metadata(self, kind, key):
+        # Latest version's metadata, or None
+        try:
+            with open(os.path.join(self._dir(kind, key), "latest.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def load(self, kind, key):
+        # (model, metadata) for the latest version, or None. Artifacts
+        # pickled by a different scikit-learn are treated as missing.
+        meta = self.metadata(kind, key)
+        if meta is None or meta.get("sklearn_version") != sklearn.__version__:
+            return None
+
+        with self._lock:
+            cached = self._loaded.get((kind, key))
+            if cached is not None:
+                self._loaded.move_to_end((kind, key))
+        if cached is not None and cached[0]["version"] == meta["version"]:
+            self._touch(kind, key)
+            return cached[1], cached[0]
+
+        path = os.path.join(self._dir(kind, key), f"{meta['version']}.pkl")
+        try:
+            with open(path, "rb") as f:
+                model = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError,
+                ImportError):
+            return None
+
+        self._remember(kind, key, meta, model)
+        self._touch(kind, key)
+        return model, meta
+
+    def delete(self, kind, key):
+        directory = self._dir(kind, key)
+        with self._lock:
+            self._loaded.pop((kind, key), None)
+        try:
+            for name in os.listdir(directory):
+                os.remove(os.path.join(directory, name))
+            os.rmdir(directory)
+        except OSError:
+            pass
+
+    def hottest(self, kind, limit=WARM_MODELS):
+        # Metadata of the `limit` most recently used models of a kind
+        base = os.path.join(self.root, kind)
+        try:
+            names = os.listdir(base)
+        except OSError:
+            return []
+
+        pointers = []
+        for name in names:
+            path = os.path.join(base, name, "latest.json")
+            try:
+                pointers.append((os.stat(path).st_mtime, path))
+            except OSError:
+                continue
+
+        result = []
+        for _, path in sorted(pointers, reverse=True)[:limit]:
+            try:
+                with open(path) as f:
+                    result.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return result
+
+    # ----- internals -----
+    def _dir(self, kind, key):
+        digest = hashlib.sha1(str(key).encode()).hexdigest()
+        return os.path.join(self.root, kind, digest)
+
+    def _remember(self, kind, key, meta, model):
+        with self._lock:
+            self._loaded[(kind, key)] = (meta, model)
+            self._loaded.move_to_end((kind, key))
+            while len(self._loaded) > self.max_loaded:
+                self._loaded.popitem(last=False)
+
+    def _write(self, path, data):
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _touch(self, kind, key):
+        try:
+            os.utime(os.path.join(self._dir(kind, key), "latest.json"))
+        except OSError:
+            pass
+
+    def _prune(self, directory, version):
+        for name in os.listdir(directory):
+            stem, ext = os.path.splitext(name)
+            if ext == ".pkl" and stem.isdigit() and int(stem) <= version - self.keep:
+                os.remove(os.path.join(directory, name))
+
+
+_model_store = None
+_model_store_lock = threading.Lock()
+
+
+def get_model_store():
+    global _model_store
+    if _model_store is None:
+        with _model_store_lock:
+            if _model_store is None:
+                _model_store = ModelStore()
+    return _model_store
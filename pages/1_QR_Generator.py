@@ -1,42 +1,28 @@
+import io
+import tempfile
 import streamlit as st
-import numpy as np
-import qrcode
-from io import BytesIO
-from sklearn.linear_model import LogisticRegression
-from database import insert_transaction, init_db  # ✅ Added init_db
+from database import enqueue_transaction, init_db  # ✅ Added init_db
+from risk_engine import RiskEngine, MIN_HISTORY, HIGH_RISK
+from training import get_scheduler
+from qr_service import get_qr_service, upi_uri, read_payment_csv, write_qr_zip
+from metrics import timer
+from auth import require_login, user_stats, invalidate_user
 
 st.title("💳 AI Secure UPI QR Generator")
 
 # ----------------------------
 # 🔐 Authentication Check
 # ----------------------------
-if "authenticated" not in st.session_state:
-    st.session_state.authenticated = False
-
-if "username" not in st.session_state:
-    st.session_state.username = None
-
-if not st.session_state.authenticated or st.session_state.username is None:
-    st.warning("Please login first.")
-    st.stop()
+# Signed session token; no database round trip
+username = require_login("Please login first.")
 
 # ✅ Initialize Database (VERY IMPORTANT)
 init_db()
 
-# ✅ Force lowercase username everywhere
-username = st.session_state.username.lower()
-
-# ----------------------------
-# Initialize Session State
-# ----------------------------
-if "transactions" not in st.session_state:
-    st.session_state.transactions = []
-
-if "model" not in st.session_state:
-    st.session_state.model = LogisticRegression()
-
-if "model_trained" not in st.session_state:
-    st.session_state.model_trained = False
+# Scores with cached models and stats; stale models are refit in a
+# training worker
+risk_engine = RiskEngine(scheduler=get_scheduler(), stats=user_stats)
+qr_service = get_qr_service()
 
 # ----------------------------
 # User Inputs
@@ -56,31 +42,18 @@ payment_type = st.radio(
 # ----------------------------
 if st.button("Generate Secure QR"):
 
-    # ----------------------------
-    # Train Model After 5 Safe Transactions
-    # ----------------------------
-    if len(st.session_state.transactions) >= 5 and not st.session_state.model_trained:
-
-        X = np.array([[t["amount"]] for t in st.session_state.transactions])
-        y = np.array([1 if t["amount"] > 5000 else 0 for t in st.session_state.transactions])
-
-        if len(np.unique(y)) > 1:
-            st.session_state.model.fit(X, y)
-            st.session_state.model_trained = True
-            st.success("🧠 AI Risk Model Activated")
-
     # ----------------------------
     # Predict Risk BEFORE Saving
     # ----------------------------
-    risk_flag = 0
-    if st.session_state.model_trained:
-        risk_flag = st.session_state.model.predict([[amount]])[0]
+    with timer("page.qr.score"):
+        risk = risk_engine.score(username, float(amount))
+    st.session_state.last_risk = f"{risk.risk_percent}%"
 
     # ----------------------------
     # 🚨 Block High Risk Transaction
     # ----------------------------
-    if risk_flag == 1:
-        st.error("🚨 High Risk Transaction Detected!")
+    if risk.history_count >= MIN_HISTORY and risk.risk_percent >= HIGH_RISK:
+        st.error(f"🚨 High Risk Transaction Detected! (Risk Score {risk.risk_percent}%)")
         st.warning("QR Generation Blocked for Security Reasons.")
         st.stop()
 
@@ -88,42 +61,87 @@ if st.button("Generate Secure QR"):
     # Save to Database (Only if Safe)
     # ----------------------------
     try:
-        insert_transaction(username, float(amount))
+        # Group-committed with other sessions; wait so the risk page sees it
+        with timer("page.qr.save"):
+            enqueue_transaction(username, float(amount)).result(timeout=10)
         st.success("Transaction Saved in Database ✅")
     except Exception as e:
         st.error(f"Database Error: {e}")
         st.stop()
 
-    # Save locally for ML
-    st.session_state.transactions.append({"amount": float(amount)})
+    # Cache listeners run after the write is acknowledged; don't wait on them
+    invalidate_user(username)
 
     # ----------------------------
-    # Generate UPI Link
+    # Generate UPI Link + QR Code
     # ----------------------------
+    # Canonical URI; identical payments are served from the QR cache
     if payment_type == "Fixed Amount (Auto Filled)":
-        upi_link = (
-            f"upi://pay?"
-            f"pa={upi_id}&"
-            f"pn={name}&"
-            f"am={amount:.2f}&"
-            f"cu=INR&"
-            f"tn={note}"
-        )
+        upi_link = upi_uri(upi_id, name, amount, note)
     else:
-        upi_link = (
-            f"upi://pay?"
-            f"pa={upi_id}&"
-            f"pn={name}&"
-            f"cu=INR&"
-            f"tn={note}"
-        )
+        upi_link = upi_uri(upi_id, name, note=note)
 
-    # ----------------------------
-    # Generate QR Code
-    # ----------------------------
-    qr = qrcode.make(upi_link)
-    buffer = BytesIO()
-    qr.save(buffer, format="PNG")
+    with timer("page.qr.render"):
+        png = qr_service.render(upi_link)
+    st.image(png, caption="Scan with Any UPI App")
+    st.success("🚀 Secure QR Generated Successfully")
+
+# ----------------------------
+# Fixed-Amount QR Codes
+# ----------------------------
+with st.expander("🧾 Pre-generate QR codes for fixed amounts"):
+    preset = st.text_input("Amounts (comma separated)", value="100, 200, 500, 1000")
 
-    st.image(buffer.getvalue(), caption="Scan with Any UPI App")
-    st.success("🚀 Secure QR Generated Successfully")
\ No newline at end of file
+    if st.button("Generate Batch"):
+        try:
+            amounts = [float(a) for a in preset.split(",") if a.strip()]
+        except ValueError:
+            st.error("Amounts must be numbers.")
+            st.stop()
+
+        with timer("page.qr.pregenerate"):
+            codes = qr_service.pregenerate(
+                upi_id, name, amounts, note, scheduler=get_scheduler()
+            )
+
+        columns = st.columns(4)
+        for i, (value, png) in enumerate(codes.items()):
+            columns[i % 4].image(png, caption=f"₹{value:.2f}")
+
+# ----------------------------
+# Bulk Merchant QR Codes
+# ----------------------------
+with st.expander("📦 Bulk QR codes from CSV"):
+    st.caption("Columns: upi_id, name, amount, note (leave amount empty for a dynamic QR)")
+    upload = st.file_uploader("Payments CSV", type="csv")
+
+    if upload is not None and st.button("Build ZIP"):
+        # PNGs render across the worker pool and stream straight into a
+        # temporary ZIP; only a bounded window of images is in memory
+        archive = tempfile.TemporaryFile()
+        try:
+            with st.spinner("Rendering QR codes..."), timer("page.qr.bulk"):
+                metrics = write_qr_zip(
+                    read_payment_csv(io.TextIOWrapper(upload, encoding="utf-8-sig", newline="")),
+                    archive,
+                    scheduler=get_scheduler()
+                )
+        except ValueError as e:
+            st.error(str(e))
+            st.stop()
+
+        col1, col2, col3 = st.columns(3)
+        col1.metric("QR Codes", metrics["codes"])
+        col2.metric("Codes / sec", f"{metrics['codes_per_sec']:.0f}")
+        col3.metric("Avg PNG Size", f"{metrics['avg_png_bytes']:.0f} B")
+
+        for line, message in metrics["errors"][:20]:
+            st.warning(f"Line {line} skipped: {message}")
+
+        archive.seek(0)
+        st.download_button(
+            "Download ZIP",
+            archive,
+            file_name="upi_qr_codes.zip",
+            mime="application/zip"
+        )
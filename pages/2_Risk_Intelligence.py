@@ -1,40 +1,37 @@
 import streamlit as st
-import numpy as np
-from database import init_db, get_user_transactions
-from ml_model import train_user_model, predict_user_risk
+from database import init_db
+from risk_engine import RiskEngine, risk_level
+from training import get_scheduler
+from metrics import timer
+from auth import require_login, user_stats, recent_transactions, invalidate_user
 
 # ================= PAGE CONFIG =================
 st.set_page_config(page_title="Risk Intelligence", layout="wide")
 
 # ================= SESSION SAFETY =================
-if "authenticated" not in st.session_state:
-    st.session_state.authenticated = False
-
-if "username" not in st.session_state:
-    st.session_state.username = None
-
-if not st.session_state.authenticated or st.session_state.username is None:
-    st.warning("Session expired. Please login again.")
-    st.stop()
+username = require_login("Session expired. Please login again.")
 
 # ================= INIT DB =================
 init_db()
 
 st.title("🧠 AI Behavioral Risk Intelligence Engine")
 
-# ✅ FIX: Force lowercase everywhere
-username = st.session_state.username.lower()
-
 # ================= REFRESH =================
+# Stats and history are cached until this user's next transaction
 if st.button("🔄 Refresh Data"):
+    invalidate_user(username)
     st.rerun()
 
-# ================= FETCH USER DATA =================
-user_history = get_user_transactions(username)
-user_history = [float(x) for x in user_history] if user_history else []
+# ================= SCORE LATEST TRANSACTION =================
+# Baseline comes from running stats (O(1)); the model from the shared cache
+# Model fits run in a training worker; this rerun never waits for one
+scheduler = get_scheduler()
+with timer("page.risk.score"):
+    result = RiskEngine(scheduler=scheduler, stats=user_stats).score_latest(username)
+txn_count = result.history_count + 1 if result else 0
 
 # ================= NEW USER =================
-if len(user_history) == 0:
+if txn_count == 0:
     st.info("👋 Welcome! Your AI Risk Engine is not activated yet.")
     st.warning("Generate your first QR transaction to start building behavioral intelligence.")
 
@@ -51,42 +48,16 @@ if len(user_history) == 0:
     st.stop()
 
 # ================= LEARNING PHASE =================
-if len(user_history) < 5:
-    st.info(f"🧠 Learning Phase: {len(user_history)}/5 transactions collected")
-    st.progress(len(user_history) / 5)
-    st.metric("Model Confidence", f"{len(user_history) * 20}%")
+if txn_count < 5:
+    st.info(f"🧠 Learning Phase: {txn_count}/5 transactions collected")
+    st.progress(txn_count / 5)
+    st.metric("Model Confidence", f"{txn_count * 20}%")
     st.success("AI is building your behavioral baseline.")
     st.stop()
 
-# ================= RISK CALCULATION =================
-latest_amount = user_history[-1]
-historical_data = np.array(user_history[:-1], dtype=float)
-
-avg_amount = np.mean(historical_data)
-std_dev = np.std(historical_data)
-
-if std_dev == 0:
-    std_dev = 1
-
-# Behavioral deviation score
-deviation_score = abs(latest_amount - avg_amount) / std_dev
-behavioral_risk = min(70, deviation_score * 15)
-
-# ================= ML MODEL =================
-try:
-    model = train_user_model(historical_data)
-    prediction, anomaly_strength = predict_user_risk(model, latest_amount)
-except Exception:
-    prediction = 0
-    anomaly_strength = 0
-
-ml_boost = 0
-if prediction == -1:
-    ml_boost = min(25, abs(anomaly_strength) * 10)
-
 # ================= FINAL SCORE =================
-risk_percent = int(min(95, behavioral_risk + ml_boost))
-confidence = min(100, len(historical_data) * 12)
+risk_percent = result.risk_percent
+confidence = result.confidence
 
 # ================= DISPLAY =================
 st.subheader("📊 Risk Assessment Result")
@@ -100,23 +71,33 @@ with col1:
 with col2:
     st.metric("Model Confidence", f"{confidence}%")
 
+if scheduler.pending(("user-model", username)):
+    st.caption("🧠 Anomaly model is retraining in the background; refresh to use it.")
+
 # Risk Badge
-if risk_percent < 30:
+level = risk_level(risk_percent)
+if level == "low":
     st.success("🟢 Low Risk – Normal Behavioral Pattern")
-elif risk_percent < 70:
+elif level == "moderate":
     st.warning("🟡 Moderate Risk – Pattern Deviation Detected")
 else:
     st.error("🔴 High Risk – Strong Behavioral Anomaly")
 
 # ================= BEHAVIORAL INSIGHTS =================
 st.write("### 🔍 Behavioral Insights")
-st.write(f"• Average Amount: ₹{round(avg_amount,2)}")
-st.write(f"• Standard Deviation: ₹{round(std_dev,2)}")
-st.write(f"• Deviation Score: {round(deviation_score,2)}")
+st.write(f"• Average Amount: ₹{round(result.mean,2)}")
+st.write(f"• Standard Deviation: ₹{round(result.std,2)}")
+st.write(f"• Deviation Score: {round(result.deviation,2)}")
 
 # ================= RECENT HISTORY =================
 st.write("### 📜 Recent Transactions")
 
-recent = user_history[-10:][::-1]
-for i, amt in enumerate(recent, 1):
-    st.write(f"{i}. ₹{amt}")
\ No newline at end of file
+# Deviation of each transaction from the baseline before it, precomputed
+# once per transaction by the feature store
+with timer("page.risk.features"):
+    recent = recent_transactions(username, limit=10)
+for i, row in enumerate(recent.iloc[::-1].itertuples(), 1):
+    if row.count >= 5:
+        st.write(f"{i}. ₹{row.amount}  ·  deviation {row.deviation:.2f}")
+    else:
+        st.write(f"{i}. ₹{row.amount}")
\ No newline at end of file
@@ -1,29 +1,55 @@
 import streamlit as st
-import matplotlib.pyplot as plt
-import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from database import init_db, HIGH_RISK_AMOUNT
+from auth import require_login, transaction_summary, transaction_series
+from charts import line_chart, pie_chart
+from metrics import timer
 
 st.title("📊 Smart AI Transaction Analytics")
 
 # ----------------------------
-# Check Data
+# Session Check
 # ----------------------------
+username = require_login("Please login first.")
 
-if "transactions" not in st.session_state or len(st.session_state.transactions) == 0:
-    st.warning("No transactions available yet.")
-    st.stop()
+init_db()
 
-transactions = st.session_state.transactions
-amounts = [t["amount"] for t in transactions]
+# ----------------------------
+# Time Range
+# ----------------------------
+# Range -> (lookback, trend bucket). Everything below is SQL aggregates over
+# the stored history, not this session's transactions, cached per user
+# until their next transaction.
+RANGES = {
+    "Last 24 hours": (timedelta(days=1), "hour"),
+    "Last 7 days": (timedelta(days=7), "hour"),
+    "Last 30 days": (timedelta(days=30), "day"),
+    "Last 90 days": (timedelta(days=90), "day"),
+    "All time": (None, "day"),
+}
+
+time_range = st.selectbox("Time Range", list(RANGES.keys()), index=2)
+lookback, bucket = RANGES[time_range]
+start = datetime.now() - lookback if lookback is not None else None
+
+with timer("page.analytics.summary"):
+    summary = transaction_summary(username, time_range, start=start)
 
-# Risk calculation (same logic as model)
-risks = [1 if amt > 5000 else 0 for amt in amounts]
+# ----------------------------
+# Check Data
+# ----------------------------
+
+if summary["count"] == 0:
+    st.warning("No transactions in this time range yet.")
+    st.stop()
 
-total_transactions = len(amounts)
-total_revenue = sum(amounts)
-high_risk = sum(risks)
+total_transactions = summary["count"]
+total_revenue = summary["total"]
+high_risk = summary["high_risk"]
 low_risk = total_transactions - high_risk
-avg_transaction = np.mean(amounts)
-max_transaction = np.max(amounts)
+avg_transaction = summary["mean"]
+max_transaction = summary["max"]
 
 # ----------------------------
 # Metrics Section
@@ -50,12 +76,28 @@ st.divider()
 
 st.subheader("📈 Transaction Trend Over Time")
 
-plt.figure()
-plt.plot(amounts, marker='o')
-plt.xlabel("Transaction Index")
-plt.ylabel("Amount (₹)")
-plt.title("Transaction Growth Trend")
-st.pyplot(plt)
+with timer("page.analytics.series"):
+    rows = transaction_series(username, time_range, start=start, bucket=bucket)
+series = pd.DataFrame(
+    rows,
+    columns=["bucket", "count", "total", "min", "max", "high_risk"]
+)
+series.index = pd.to_datetime(series.pop("bucket"))
+
+# Rendered once per data version and shared across sessions; long ranges
+# are downsampled to a fixed point budget
+st.image(line_chart(
+    "transaction-trend",
+    (username, bucket, hash(tuple(rows))),
+    series.index.to_pydatetime(),
+    {
+        "Total": (series["total"].to_numpy(), {"marker": "o"}),
+        "Largest": (series["max"].to_numpy(), {"linestyle": "--"}),
+    },
+    title="Transaction Growth Trend",
+    xlabel=bucket.capitalize(),
+    ylabel="Amount (₹)"
+))
 
 # ----------------------------
 # Risk Distribution Pie Chart
@@ -63,14 +105,13 @@ st.pyplot(plt)
 
 st.subheader("🛑 Risk Distribution")
 
-plt.figure()
-plt.pie(
+st.image(pie_chart(
+    "risk-distribution",
+    username,
     [low_risk, high_risk],
-    labels=["Low Risk", "High Risk"],
-    autopct="%1.1f%%"
-)
-plt.title("Risk Breakdown")
-st.pyplot(plt)
+    ["Low Risk", "High Risk"],
+    title="Risk Breakdown"
+))
 
 # ----------------------------
 # AI Insight Section
@@ -86,4 +127,4 @@ else:
 if avg_transaction > 4000:
     st.warning("💡 Average transaction value is relatively high.")
 
-st.info("AI risk threshold currently set at ₹5000.")
\ No newline at end of file
+st.info(f"AI risk threshold currently set at ₹{HIGH_RISK_AMOUNT}.")
@@ -1,6 +1,14 @@
+import os
+import math
+import time
 import streamlit as st
-import yfinance as yf
 import plotly.graph_objects as go
+from market_data import get_store, REPLAY_DIR
+from market_poller import get_poller
+from streaming import TickStream, SimulatedTickSource, ReplayTickSource
+from simulation import run_monte_carlo, volatility_risk_index
+from metrics import timer
+from training import get_scheduler
 
 st.set_page_config(layout="wide")
 st.title("📊 Live BSE / NSE Market Dashboard")
@@ -20,20 +28,35 @@ symbol = tickers[option]
 # -----------------------------
 # Fetch Market Data
 # -----------------------------
-try:
-    data = yf.download(symbol, period="1d", interval="5m", progress=False)
-except Exception:
-    st.error("Error fetching market data.")
-    st.stop()
+# One process-wide poller refreshes every ticker with a batched download;
+# sessions just read its latest snapshot
+poller = get_poller(list(tickers.values()), "5m", "1d")
+snapshot = poller.snapshot(symbol)
+
+if snapshot is not None:
+    data = snapshot.data
+    fetched_at = snapshot.updated_at
+else:
+    # First request before the poller has published anything
+    try:
+        with timer("page.market.cold_fetch"):
+            data = get_store().get_bars(symbol, "5m", "1d")
+        fetched_at = get_store().fetched_at(symbol, "5m")
+    except Exception:
+        st.error("Error fetching market data.")
+        st.stop()
+
+if fetched_at is not None:
+    age = int(time.time() - fetched_at)
+    if age > poller.max_age:
+        st.warning(f"⏱ Market data may be stale (last refreshed {age}s ago).")
+    else:
+        st.caption(f"⏱ Last refreshed {age}s ago")
 
 if data.empty:
     st.error("No market data available.")
     st.stop()
 
-# Flatten multi-index columns if present
-if isinstance(data.columns, type(data.columns)) and hasattr(data.columns, "levels"):
-    data.columns = data.columns.get_level_values(0)
-
 # Clean data
 data = data.dropna()
 
@@ -101,9 +124,121 @@ volatility = float(volatility_value) * 100
 st.markdown("---")
 st.subheader("📈 Market Risk Index")
 
-if volatility > 1.2:
+risk_index = volatility_risk_index(volatility)
+if risk_index == "High":
     st.error(f"High Market Volatility: {volatility:.2f}%")
-elif volatility > 0.6:
+elif risk_index == "Moderate":
     st.warning(f"Moderate Market Volatility: {volatility:.2f}%")
 else:
-    st.success(f"Low Market Volatility: {volatility:.2f}%")
\ No newline at end of file
+    st.success(f"Low Market Volatility: {volatility:.2f}%")
+
+# -----------------------------
+# Monte Carlo Simulation
+# -----------------------------
+SIM_MODELS = {
+    "Geometric Brownian Motion": "gbm",
+    "Jump Diffusion (Merton)": "jump",
+    "Bootstrap from History": "bootstrap",
+}
+
+st.markdown("---")
+st.subheader("🎲 Monte Carlo Simulation")
+
+col1, col2, col3 = st.columns(3)
+sim_model = col1.selectbox("Model", list(SIM_MODELS.keys()))
+sim_paths = col2.select_slider("Paths", [1_000, 10_000, 50_000, 100_000], value=10_000)
+sim_steps = col3.number_input("Horizon (5m bars)", min_value=2, max_value=375, value=75)
+
+if st.button("Run Simulation"):
+
+    # Calibrate on the stored bars (up to 5 sessions), not just today
+    history = get_store().read(symbol, "5m", "5d")["Close"].to_numpy()
+    if len(history) < len(close_series):
+        history = close_series.to_numpy()
+
+    # Path chunks are spread over the training process pool
+    with st.spinner(f"Simulating {sim_paths:,} paths..."), timer("page.market.simulation"):
+        sim = run_monte_carlo(
+            history,
+            SIM_MODELS[sim_model],
+            n_paths=sim_paths,
+            steps=int(sim_steps),
+            scheduler=get_scheduler()
+        )
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric(f"VaR ({sim.confidence:.0%})", f"{sim.var * 100:.2f}%")
+    col2.metric(f"CVaR ({sim.confidence:.0%})", f"{sim.cvar * 100:.2f}%")
+    col3.metric("Expected Return", f"{sim.expected_return * 100:+.2f}%")
+    col4.metric("Simulated Risk Index", f"{sim.risk_index} ({sim.volatility:.2f}%)")
+
+    steps_axis = list(range(sim.steps + 1))
+    sim_fig = go.Figure()
+
+    for path in sim.sample_paths:
+        sim_fig.add_trace(go.Scatter(
+            x=steps_axis, y=path, mode="lines",
+            line=dict(width=1, color="rgba(0,194,184,0.15)"),
+            showlegend=False, hoverinfo="skip"
+        ))
+
+    for band, name in zip(sim.bands, ["5th pct", "Median", "95th pct"]):
+        sim_fig.add_trace(go.Scatter(x=steps_axis, y=band, mode="lines", name=name))
+
+    sim_fig.update_layout(
+        template="plotly_dark",
+        height=400,
+        title=f"{option}: {sim.n_paths:,} simulated paths",
+        xaxis_title="5m bars ahead",
+        yaxis_title="Price"
+    )
+
+    st.plotly_chart(sim_fig, use_container_width=True)
+
+# -----------------------------
+# Live Tick Stream
+# -----------------------------
+STREAM_BAR_SECONDS = 5
+STREAM_CAPACITY = 240          # bars kept in the ring buffer (20 minutes)
+STREAM_REFRESH_SECONDS = 0.5
+
+st.markdown("---")
+st.subheader("⚡ Live Tick Stream")
+
+
+# Reruns on its own timer without re-running the rest of the page; bars
+# are aggregated incrementally and the chart only holds the ring buffer
+@st.fragment(run_every=STREAM_REFRESH_SECONDS)
+def render_stream(stream):
+    with timer("page.market.stream_pump"):
+        stream.pump()
+
+    if stream.last_price is not None:
+        vol = stream.volatility.value
+        st.metric(
+            "Last Tick",
+            f"₹{stream.last_price:.2f}",
+            f"Volatility {vol * 100:.3f}%" if not math.isnan(vol) else None,
+            delta_color="off"
+        )
+
+    st.line_chart(stream.bars.frame(include_open=True)[["Close"]])
+
+
+if st.toggle("Stream ticks", key="stream_ticks"):
+
+    stream_key = f"tick_stream_{symbol}"
+
+    # Ticks are replayed from <symbol>_ticks.csv in the replay directory if
+    # present, otherwise simulated around the latest price
+    if stream_key not in st.session_state:
+        tick_file = os.path.join(REPLAY_DIR, f"{symbol}_ticks.csv") if REPLAY_DIR else None
+        if tick_file and os.path.exists(tick_file):
+            source = ReplayTickSource(tick_file)
+        else:
+            source = SimulatedTickSource(latest)
+        st.session_state[stream_key] = TickStream(
+            source, bar_seconds=STREAM_BAR_SECONDS, capacity=STREAM_CAPACITY
+        )
+
+    render_stream(st.session_state[stream_key])
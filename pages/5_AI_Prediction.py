@@ -1,10 +1,13 @@
 import streamlit as st
-import yfinance as yf
 import numpy as np
 import pandas as pd
-from sklearn.linear_model import LinearRegression
-from sklearn.model_selection import train_test_split
 import plotly.graph_objects as go
+from ml_model import get_price_model
+from market_data import get_store
+from feature_store import get_feature_store
+from training import get_scheduler
+from backtest import run_backtest, TRAIN_SIZE
+from metrics import timer
 
 st.set_page_config(layout="wide")
 st.title("🤖 AI Market Prediction Lab")
@@ -22,9 +25,16 @@ option = st.selectbox("Select Stock / Index", list(tickers.keys()))
 symbol = tickers[option]
 
 # -----------------------------
-# Fetch Data
+# Fetch Data + Features
 # -----------------------------
-data = yf.download(symbol, period="3mo", interval="1d", progress=False)
+# Return / Volatility come precomputed from the feature store; only bars
+# added since the last render are featured
+try:
+    with timer("page.prediction.features"):
+        data = get_feature_store().symbol_features(symbol, "1d", "3mo")
+except Exception:
+    st.error("Error fetching market data.")
+    st.stop()
 
 if data.empty:
     st.error("No data available.")
@@ -32,17 +42,6 @@ if data.empty:
 
 data = data.dropna()
 
-# Flatten multi-index if needed
-if hasattr(data.columns, "levels"):
-    data.columns = data.columns.get_level_values(0)
-
-# -----------------------------
-# Feature Engineering
-# -----------------------------
-data["Return"] = data["Close"].pct_change()
-data["Volatility"] = data["Return"].rolling(5).std()
-data = data.dropna()
-
 # Create prediction target (next day close)
 data["Next_Close"] = data["Close"].shift(-1)
 data = data.dropna()
@@ -53,11 +52,27 @@ y = data["Next_Close"]
 # -----------------------------
 # Train Model
 # -----------------------------
-model = LinearRegression()
-model.fit(X, y)
+# Fitted in a training worker and kept in the model store, so a restart
+# reuses the stored fit; while a refit for new bars runs, the previous
+# model keeps serving
+with timer("page.prediction.model"):
+    model, fresh = get_price_model(
+        symbol,
+        X.to_numpy(),
+        y.to_numpy(),
+        scheduler=get_scheduler(),
+        timeout=30
+    )
+
+if model is None:
+    st.warning("Prediction model is still training. Please refresh shortly.")
+    st.stop()
+
+if not fresh:
+    st.caption("🧠 Model is retraining on the latest bars; showing the previous fit.")
 
 latest_close = float(data["Close"].iloc[-1])
-predicted_price = float(model.predict([[latest_close]])[0])
+predicted_price = float(model.predict(np.array([[latest_close]]))[0])
 
 # -----------------------------
 # Direction Prediction
@@ -127,4 +142,37 @@ fig.update_layout(
     height=450
 )
 
-st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
+st.plotly_chart(fig, use_container_width=True)
+
+st.divider()
+
+# -----------------------------
+# Walk-Forward Backtest
+# -----------------------------
+st.subheader("📏 Model Accuracy (Walk-Forward Backtest)")
+
+if st.button("Run Backtest (2 years)"):
+
+    history = get_store().get_bars(symbol, "1d", "2y")["Close"].dropna()
+
+    if len(history) <= TRAIN_SIZE + 10:
+        st.warning("Not enough history to backtest this symbol.")
+    else:
+        with st.spinner("Running walk-forward evaluation..."), timer("page.prediction.backtest"):
+            report = run_backtest(
+                {symbol: history.to_numpy()},
+                scheduler=get_scheduler()
+            )
+
+        st.dataframe(
+            report[[
+                "model", "n", "mae", "rmse", "mape",
+                "direction_accuracy", "fits_per_sec", "predictions_per_sec"
+            ]].round(3),
+            hide_index=True,
+            use_container_width=True
+        )
+        st.caption(
+            "linear_close is the model shown above. Errors are in price units; "
+            "MAPE and direction accuracy are percentages."
+        )
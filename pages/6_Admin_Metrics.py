@@ -0,0 +1,84 @@
+import os
+import streamlit as st
+import pandas as pd
+import charts
+from metrics import snapshot, prometheus_text, write_jsonl, start_exporters, METRICS_FILE
+from ml_model import registry
+from qr_service import get_qr_service
+from auth import require_login, user_cache, summary_cache
+
+# ================= PAGE CONFIG =================
+st.set_page_config(page_title="Admin Metrics", layout="wide")
+
+# ================= ADMIN GATE =================
+# Streamlit lists every file in pages/, so the page is gated rather than
+# hidden. ARTHA_ADMIN_USERS is a comma-separated list of usernames.
+ADMIN_USERS = {
+    name.strip().lower()
+    for name in os.environ.get("ARTHA_ADMIN_USERS", "").split(",")
+    if name.strip()
+}
+
+username = require_login("This page is only available to administrators.")
+
+if username not in ADMIN_USERS:
+    st.warning("This page is only available to administrators.")
+    st.stop()
+
+start_exporters()
+
+st.title("⏱ Latency & Cache Metrics")
+
+current = snapshot()
+
+# ================= TIMERS =================
+st.subheader("Stage Latency")
+
+timers = pd.DataFrame.from_dict(current["timers"], orient="index")
+if timers.empty:
+    st.info("Nothing timed yet in this process.")
+else:
+    timers = timers.sort_values("p95_ms", ascending=False)
+    st.dataframe(timers.round(3), use_container_width=True)
+
+# ================= COUNTERS & CACHES =================
+st.subheader("Counters")
+
+if current["counters"]:
+    st.dataframe(
+        pd.Series(current["counters"], name="value").to_frame(),
+        use_container_width=True
+    )
+
+st.subheader("Caches")
+
+qr_stats = get_qr_service().stats()
+caches = pd.DataFrame({
+    "User models": registry.stats(),
+    "QR codes": qr_stats,
+    "Charts": {
+        "hits": charts.cache.hits,
+        "misses": charts.cache.misses,
+        "size": len(charts.cache._entries),
+    },
+    "User records": user_cache.stats(),
+    "Transaction summaries": summary_cache.stats(),
+}).T
+st.dataframe(caches, use_container_width=True)
+
+# ================= EXPORT =================
+st.subheader("Export")
+
+col1, col2 = st.columns(2)
+
+col1.download_button(
+    "Download Prometheus Metrics",
+    prometheus_text(),
+    file_name="metrics.prom",
+    mime="text/plain"
+)
+
+path = METRICS_FILE or "metrics.jsonl"
+if col2.button("Write JSONL Snapshot"):
+    write_jsonl(path)
+    col2.success(f"Appended snapshot to {path}")
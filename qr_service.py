@@ -0,0 +1,319 @@
+import io
+import csv
+import re
+import time
+import zipfile
+import threading
+from collections import OrderedDict, deque
+from urllib.parse import quote
+
+import qrcode
+
+from metrics import timed, inc
+from qrcode.constants import (
+    ERROR_CORRECT_L,
+    ERROR_CORRECT_M,
+    ERROR_CORRECT_Q,
+    ERROR_CORRECT_H
+)
+
+# ---------------- QR SETTINGS ----------------
+QR_CACHE_SIZE = 1024          # rendered PNGs kept in memory (LRU)
+ERROR_CORRECTION = "M"        # L ~7%, M ~15%, Q ~25%, H ~30% recoverable
+BOX_SIZE = 6                  # pixels per module (qrcode.make uses 10)
+BORDER = 4                    # quiet zone in modules; 4 is the spec minimum
+BATCH_CHUNK = 16              # URIs per worker task in pregenerate()/bulk
+BULK_WINDOW = 8               # bulk chunks in flight; bounds memory use
+
+ERROR_LEVELS = {
+    "L": ERROR_CORRECT_L,
+    "M": ERROR_CORRECT_M,
+    "Q": ERROR_CORRECT_Q,
+    "H": ERROR_CORRECT_H,
+}
+
+
+# ---------------- UPI URI ----------------
+def upi_uri(payee, name, amount=None, note=None, currency="INR"):
+    # Canonical upi://pay URI: fixed parameter order, trimmed and
+    # percent-encoded values, amount to two decimals, empty fields dropped.
+    # Equal payments always give the same string, so it is the cache key.
+    params = [
+        ("pa", payee.strip()),
+        ("pn", name.strip()),
+        ("am", f"{float(amount):.2f}" if amount is not None else ""),
+        ("cu", currency),
+        ("tn", (note or "").strip()),
+    ]
+    return "upi://pay?" + "&".join(
+        f"{key}={quote(value, safe='@.-_')}" for key, value in params if value
+    )
+
+
+# ---------------- RENDERING ----------------
+@timed("qr.render")
+def render_png(data, error_correction=ERROR_CORRECTION, box_size=BOX_SIZE,
+               border=BORDER):
+    # Top-level so it can run in a worker process
+    qr = qrcode.QRCode(
+        error_correction=ERROR_LEVELS[error_correction],
+        box_size=box_size,
+        border=border
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    # 1-bit image, optimised PNG: a few hundred bytes per code
+    buffer = io.BytesIO()
+    qr.make_image().get_image().save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def render_many(uris, error_correction=ERROR_CORRECTION, box_size=BOX_SIZE,
+                border=BORDER):
+    return [render_png(uri, error_correction, box_size, border) for uri in uris]
+
+
+# ---------------- QR SERVICE ----------------
+class QRService:
+    # PNG bytes cached by canonical URI and render settings. Merchants
+    # regenerate the same payee/amount/note constantly; those hits cost a
+    # dictionary lookup instead of a QR encode and PNG compress.
+
+    def __init__(self, max_size=QR_CACHE_SIZE, error_correction=ERROR_CORRECTION,
+                 box_size=BOX_SIZE, border=BORDER):
+        self.max_size = max_size
+        self.settings = (error_correction, box_size, border)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, uri):
+        png = self._get(uri)
+        if png is None:
+            png = render_png(uri, *self.settings)
+            self._put(uri, png)
+        return png
+
+    def payment_qr(self, payee, name, amount=None, note=None):
+        return self.render(upi_uri(payee, name, amount, note))
+
+    def pregenerate(self, payee, name, amounts, note=None, scheduler=None):
+        # Renders codes for a list of fixed amounts; returns {amount: png}.
+        # With a scheduler (training.TrainingScheduler) uncached codes are
+        # rendered in its worker processes, BATCH_CHUNK per task.
+        uris = {amount: upi_uri(payee, name, amount, note) for amount in amounts}
+        missing = [uri for uri in dict.fromkeys(uris.values()) if self._get(uri) is None]
+
+        chunks = [
+            missing[i:i + BATCH_CHUNK] for i in range(0, len(missing), BATCH_CHUNK)
+        ]
+        if scheduler is None or len(chunks) <= 1:
+            rendered = [render_many(chunk, *self.settings) for chunk in chunks]
+        else:
+            futures = [
+                scheduler.submit(("qr", self.settings) + tuple(chunk),
+                                 render_many, chunk, *self.settings)
+                for chunk in chunks
+            ]
+            rendered = [f.result() for f in futures]
+
+        pngs = {}
+        for chunk, images in zip(chunks, rendered):
+            for uri, png in zip(chunk, images):
+                self._put(uri, png)
+                pngs[uri] = png
+
+        return {
+            amount: pngs.get(uri) or self.render(uri)
+            for amount, uri in uris.items()
+        }
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+    # ----- internals -----
+    def _get(self, uri):
+        with self._lock:
+            png = self._entries.get(uri)
+            if png is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(uri)
+                self.hits += 1
+        inc("qr.cache_misses" if png is None else "qr.cache_hits")
+        return png
+
+    def _put(self, uri, png):
+        with self._lock:
+            self._entries[uri] = png
+            self._entries.move_to_end(uri)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+# ---------------- BULK PIPELINE ----------------
+def read_payment_csv(stream):
+    # Yields (line, upi_id, name, amount or None, note) from a CSV with an
+    # upi_id,name,amount,note header, and (line, error) for rows that can't
+    # be used. Reads lazily, so the file is never loaded whole.
+    reader = csv.DictReader(stream)
+    missing = {"upi_id", "name"} - set(reader.fieldnames or ())
+    if missing:
+        raise ValueError(f"CSV is missing columns: {', '.join(sorted(missing))}")
+
+    for line, row in enumerate(reader, 2):
+        payee = (row.get("upi_id") or "").strip()
+        name = (row.get("name") or "").strip()
+        amount = (row.get("amount") or "").strip()
+        if not payee or not name:
+            yield line, "upi_id and name are required"
+            continue
+        try:
+            amount = float(amount) if amount else None
+        except ValueError:
+            yield line, f"invalid amount {amount!r}"
+            continue
+        if amount is not None and amount <= 0:
+            yield line, f"invalid amount {amount!r}"
+            continue
+        yield line, payee, name, amount, (row.get("note") or "").strip()
+
+
+def _chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_bulk_codes(payments, settings=(ERROR_CORRECTION, BOX_SIZE, BORDER),
+                    scheduler=None, chunk_size=BATCH_CHUNK, window=BULK_WINDOW):
+    # payments: (key, uri) pairs. Yields (key, uri, png) in input order.
+    # With a scheduler, at most `window` chunks are rendering or waiting to
+    # be consumed at any time, whatever the input length.
+    pending = deque()
+    batch = id(pending)
+
+    for n, chunk in enumerate(_chunks(payments, chunk_size)):
+        uris = [uri for _, uri in chunk]
+        if scheduler is None:
+            pending.append((chunk, render_many(uris, *settings)))
+        else:
+            pending.append((chunk, scheduler.submit(
+                ("qr-bulk", batch, n), render_many, uris, *settings
+            )))
+
+        while len(pending) >= (window if scheduler is not None else 1):
+            yield from _finished(*pending.popleft())
+
+    while pending:
+        yield from _finished(*pending.popleft())
+
+
+def _finished(chunk, result):
+    pngs = result.result() if hasattr(result, "result") else result
+    for (key, uri), png in zip(chunk, pngs):
+        yield key, uri, png
+
+
+def _filename(number, payee, amount):
+    payee = re.sub(r"[^A-Za-z0-9@._-]+", "_", payee)[:64]
+    amount = f"{amount:.2f}" if amount is not None else "any"
+    return f"{number:05d}_{payee}_{amount}.png"
+
+
+def write_qr_zip(rows, out, settings=(ERROR_CORRECTION, BOX_SIZE, BORDER),
+                 scheduler=None):
+    # rows: read_payment_csv() output. Streams one PNG per valid row into
+    # the ZIP `out` (path or binary file object) plus a manifest.csv, and
+    # returns throughput metrics. PNGs are stored, not deflated again.
+    started = time.perf_counter()
+    errors = []
+    manifest = io.StringIO()
+    writer = csv.writer(manifest)
+    writer.writerow(["file", "upi_id", "name", "amount", "note", "uri"])
+
+    def payments():
+        for row in rows:
+            if len(row) == 2:
+                errors.append(row)
+                continue
+            line, payee, name, amount, note = row
+            yield (line, payee, name, amount, note), upi_uri(payee, name, amount, note)
+
+    codes = png_bytes = 0
+    render_started = time.perf_counter()
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_STORED) as archive:
+        for (line, payee, name, amount, note), uri, png in iter_bulk_codes(
+            payments(), settings, scheduler
+        ):
+            codes += 1
+            png_bytes += len(png)
+            filename = _filename(codes, payee, amount)
+            archive.writestr(filename, png)
+            writer.writerow([filename, payee, name, amount, note, uri])
+        render_seconds = time.perf_counter() - render_started
+        archive.writestr("manifest.csv", manifest.getvalue())
+
+    seconds = time.perf_counter() - started
+    return {
+        "codes": codes,
+        "errors": errors,
+        "png_bytes": png_bytes,
+        "avg_png_bytes": png_bytes / codes if codes else 0.0,
+        "seconds": seconds,
+        "codes_per_sec": codes / render_seconds if render_seconds else 0.0,
+    }
+
+
+_qr_service = None
+_qr_service_lock = threading.Lock()
+
+
+def get_qr_service():
+    global _qr_service
+    if _qr_service is None:
+        with _qr_service_lock:
+            if _qr_service is None:
+                _qr_service = QRService()
+    return _qr_service
+
+
+# ---------------- COMMAND LINE ----------------
+if __name__ == "__main__":
+    import argparse
+
+    # Import by module name so worker processes can unpickle the jobs
+    import qr_service
+    from training import get_scheduler
+
+    parser = argparse.ArgumentParser(description="Bulk UPI QR codes from a CSV")
+    parser.add_argument("csv", help="upi_id,name,amount,note rows")
+    parser.add_argument("zip", help="output ZIP file")
+    parser.add_argument("--error-correction", default=ERROR_CORRECTION, choices=list(ERROR_LEVELS))
+    parser.add_argument("--box-size", type=int, default=BOX_SIZE)
+    parser.add_argument("--border", type=int, default=BORDER)
+    parser.add_argument("--serial", action="store_true", help="don't use the process pool")
+    args = parser.parse_args()
+
+    with open(args.csv, newline="", encoding="utf-8-sig") as f:
+        metrics = qr_service.write_qr_zip(
+            qr_service.read_payment_csv(f),
+            args.zip,
+            (args.error_correction, args.box_size, args.border),
+            scheduler=None if args.serial else get_scheduler()
+        )
+
+    for line, message in metrics["errors"]:
+        print(f"line {line}: {message}")
+    print(
+        f"{metrics['codes']} codes, {metrics['png_bytes']} PNG bytes "
+        f"in {metrics['seconds']:.2f}s ({metrics['codes_per_sec']:.0f} codes/s)"
+    )
@@ -0,0 +1,140 @@
+import time
+from collections import namedtuple
+
+from database import get_user_stats, get_user_transactions
+from ml_model import (
+    registry,
+    predict_user_risk,
+    behavioral_risk,
+    ml_boost,
+    combine_risk,
+    CONFIDENCE_PER_TXN
+)
+from metrics import observe
+
+# ---------------- RISK BANDS ----------------
+MIN_HISTORY = 5               # transactions before scoring activates
+MODERATE_RISK = 30
+HIGH_RISK = 70
+
+RiskResult = namedtuple("RiskResult", [
+    "amount",
+    "risk_percent",
+    "confidence",
+    "mean",
+    "std",
+    "deviation",
+    "behavioral_risk",
+    "ml_boost",
+    "prediction",
+    "anomaly_score",
+    "history_count",
+    "elapsed_ms",
+])
+
+
+def risk_level(risk_percent):
+    if risk_percent < MODERATE_RISK:
+        return "low"
+    if risk_percent < HIGH_RISK:
+        return "moderate"
+    return "high"
+
+
+# ---------------- RISK ENGINE ----------------
+class RiskEngine:
+    # Headless behavioural + IsolationForest scoring. Holds no per-user
+    # state: baselines come from user_stats and models from the shared
+    # ModelRegistry, so it can run in any thread or worker process.
+    #
+    # How a missing or stale model is handled:
+    #   scheduler given  -> refit in a training worker; score now with the
+    #                       previous model or the behavioural score alone
+    #   fit_inline=True  -> fit synchronously before scoring
+    #   fit_inline=False -> only ever use what is already cached
+    #
+    # stats: get_user_stats or a cached stand-in with the same signature
+
+    def __init__(self, models=registry, fit_inline=True, scheduler=None,
+                 stats=get_user_stats):
+        self.models = models
+        self.fit_inline = fit_inline
+        self.scheduler = scheduler
+        self.stats = stats
+
+    def score(self, username, amount):
+        # Scores a new (not yet stored) amount against the full history
+        username = username.lower().strip()
+        stats = self.stats(username)
+
+        return self._score(
+            username,
+            float(amount),
+            stats,
+            lambda: get_user_transactions(username)
+        )
+
+    def score_latest(self, username):
+        # Scores the most recent stored transaction against the ones before
+        # it; returns None for users with no transactions
+        username = username.lower().strip()
+        baseline = self.stats(username, exclude_last=True)
+        if baseline is None:
+            return None
+
+        return self._score(
+            username,
+            float(baseline["last_amount"]),
+            baseline,
+            lambda: get_user_transactions(username)[:-1]
+        )
+
+    def _score(self, username, amount, stats, load_history):
+        started = time.perf_counter()
+
+        if stats is None:
+            stats = {"count": 0, "mean": 0.0, "std": 0.0}
+
+        count, mean = stats["count"], stats["mean"]
+        std = stats["std"] or 1.0
+        deviation, behavioral = behavioral_risk(amount, mean, std)
+
+        try:
+            model = self._model(username, stats, load_history)
+            prediction, anomaly_score = predict_user_risk(model, amount)
+        except Exception:
+            prediction, anomaly_score = None, 0
+
+        boost = ml_boost(anomaly_score) if prediction == -1 else 0.0
+        elapsed = time.perf_counter() - started
+        observe("risk.score", elapsed)
+
+        return RiskResult(
+            amount=amount,
+            risk_percent=int(combine_risk(behavioral, boost)),
+            confidence=min(100, count * CONFIDENCE_PER_TXN),
+            mean=mean,
+            std=std,
+            deviation=float(deviation),
+            behavioral_risk=float(behavioral),
+            ml_boost=float(boost),
+            prediction=prediction,
+            anomaly_score=float(anomaly_score),
+            history_count=count,
+            elapsed_ms=elapsed * 1000,
+        )
+
+    def _model(self, username, stats, load_history):
+        if stats["count"] < MIN_HISTORY:
+            return None
+        if not self.fit_inline and self.scheduler is None:
+            return self.models.peek(username)
+
+        return self.models.get(
+            username,
+            stats["count"],
+            load_history,
+            mean=stats["mean"],
+            std=stats["std"],
+            scheduler=self.scheduler
+        )
@@ -0,0 +1,238 @@
+import itertools
+from collections import namedtuple
+
+import numpy as np
+
+# ---------------- SIMULATION SETTINGS ----------------
+CHUNK_PATHS = 10_000          # paths generated per chunk / worker task
+SAMPLE_PATHS = 50             # paths kept for plotting
+BANDS = (5, 50, 95)           # percentile bands returned per step
+BAND_BINS = 2048              # log-price histogram bins per step for the bands
+BAND_SPAN_SD = 8              # histogram half-width in per-horizon std devs
+
+# Same thresholds as the Market Risk Index on the Live Market page (% std
+# of bar-to-bar returns)
+HIGH_VOLATILITY = 1.2
+MODERATE_VOLATILITY = 0.6
+
+MODELS = ("gbm", "jump", "bootstrap")
+
+SimulationResult = namedtuple("SimulationResult", [
+    "model",
+    "n_paths",
+    "steps",
+    "start_price",
+    "expected_return",    # mean terminal simple return
+    "var",                # value at risk (loss fraction, positive)
+    "cvar",               # expected shortfall beyond VaR
+    "confidence",
+    "volatility",         # mean per-path volatility, % per step
+    "risk_index",         # "High" / "Moderate" / "Low"
+    "terminal_prices",    # terminal price percentiles {p: price}
+    "bands",              # (len(BANDS), steps + 1) per-step percentiles
+    "sample_paths",       # (SAMPLE_PATHS, steps + 1)
+])
+
+
+def volatility_risk_index(volatility_pct):
+    if volatility_pct > HIGH_VOLATILITY:
+        return "High"
+    if volatility_pct > MODERATE_VOLATILITY:
+        return "Moderate"
+    return "Low"
+
+
+# ---------------- CALIBRATION ----------------
+def estimate_params(closes):
+    # Per-step drift/vol of log returns plus a simple jump estimate:
+    # returns beyond 3 std are treated as jumps
+    log_returns = np.diff(np.log(np.asarray(closes, dtype=float)))
+    log_returns = log_returns[np.isfinite(log_returns)]
+    if len(log_returns) < 2:
+        raise ValueError("Need at least three prices to calibrate")
+
+    mu, sigma = float(log_returns.mean()), float(log_returns.std(ddof=1))
+    jumps = log_returns[np.abs(log_returns - mu) > 3 * sigma]
+    diffusion = log_returns[np.abs(log_returns - mu) <= 3 * sigma]
+
+    return {
+        "mu": mu,
+        "sigma": float(diffusion.std(ddof=1)) if len(diffusion) > 1 else sigma,
+        "jump_rate": len(jumps) / len(log_returns),
+        "jump_mu": float(jumps.mean()) if len(jumps) else 0.0,
+        "jump_sigma": float(jumps.std()) if len(jumps) > 1 else sigma,
+        "log_returns": log_returns,
+    }
+
+
+# ---------------- PATH GENERATORS ----------------
+# Each returns log-return increments of shape (n_paths, steps).
+def gbm_increments(rng, n_paths, steps, mu, sigma, **_):
+    return rng.normal(mu, sigma, size=(n_paths, steps))
+
+
+def jump_increments(rng, n_paths, steps, mu, sigma, jump_rate, jump_mu,
+                    jump_sigma, **_):
+    # Merton jump-diffusion: Gaussian diffusion plus compound Poisson jumps
+    increments = rng.normal(mu, sigma, size=(n_paths, steps))
+    counts = rng.poisson(jump_rate, size=(n_paths, steps))
+    jumped = counts > 0
+    increments[jumped] += rng.normal(
+        jump_mu * counts[jumped], jump_sigma * np.sqrt(counts[jumped])
+    )
+    return increments
+
+
+def bootstrap_increments(rng, n_paths, steps, log_returns, **_):
+    return rng.choice(log_returns, size=(n_paths, steps), replace=True)
+
+
+GENERATORS = {
+    "gbm": gbm_increments,
+    "jump": jump_increments,
+    "bootstrap": bootstrap_increments,
+}
+
+
+# ---------------- BAND HISTOGRAMS ----------------
+# Percentiles of separate chunks can't be combined into percentiles of all
+# paths, but histograms over shared edges can: chunks return per-step
+# counts of log(price / start) and the driver reads quantiles off the sum,
+# accurate to one bin width.
+def band_edges(params, steps, bins=BAND_BINS):
+    drift = params["mu"] + params["jump_rate"] * params["jump_mu"]
+    variance = params["sigma"] ** 2 + params["jump_rate"] * (
+        params["jump_mu"] ** 2 + params["jump_sigma"] ** 2
+    )
+    span = abs(drift) * steps + BAND_SPAN_SD * np.sqrt(variance * steps)
+    span = max(span, 1e-6)
+    return np.linspace(-span, span, bins + 1)
+
+
+def step_histograms(log_paths, edges):
+    # (steps + 1, bins) counts; values outside the edges land in the end bins
+    bins = len(edges) - 1
+    width = edges[1] - edges[0]
+    index = np.floor((log_paths - edges[0]) / width).astype(np.int64)
+    np.clip(index, 0, bins - 1, out=index)
+    index += np.arange(log_paths.shape[1]) * bins
+    return np.bincount(
+        index.ravel(), minlength=log_paths.shape[1] * bins
+    ).reshape(log_paths.shape[1], bins)
+
+
+def histogram_percentiles(counts, edges, percentiles):
+    # (len(percentiles), rows), interpolating linearly inside the bin
+    rows = np.arange(len(counts))
+    width = edges[1] - edges[0]
+    cumulative = np.cumsum(counts, axis=1)
+    total = cumulative[:, -1]
+
+    result = np.empty((len(percentiles), len(counts)))
+    for i, p in enumerate(percentiles):
+        target = total * p / 100
+        bin_ = np.minimum((cumulative < target[:, None]).sum(axis=1), counts.shape[1] - 1)
+        before = np.where(bin_ > 0, cumulative[rows, bin_ - 1], 0)
+        inside = counts[rows, bin_]
+        fraction = np.divide(
+            target - before, inside,
+            out=np.full(len(counts), 0.5), where=inside > 0
+        )
+        result[i] = edges[bin_] + np.clip(fraction, 0, 1) * width
+    return result
+
+
+# ---------------- CHUNK WORKER ----------------
+def simulate_chunk(model, start_price, steps, n_paths, params, seed,
+                   edges, keep_paths=0):
+    # Generates one chunk and reduces it to per-path summaries and per-step
+    # histograms, so only O(n_paths + steps * bins) values leave the worker,
+    # never the full path matrix
+    rng = np.random.default_rng(seed)
+    increments = GENERATORS[model](rng, n_paths, steps, **params)
+
+    log_paths = np.empty((n_paths, steps + 1))
+    log_paths[:, 0] = 0.0
+    np.cumsum(increments, axis=1, out=log_paths[:, 1:])
+
+    step_returns = np.expm1(increments)
+
+    return {
+        "terminal": start_price * np.exp(log_paths[:, -1]),
+        "volatility": step_returns.std(axis=1, ddof=1) * 100,
+        "histograms": step_histograms(log_paths, edges),
+        "sample": start_price * np.exp(log_paths[:keep_paths]),
+    }
+
+
+# ---------------- MONTE CARLO DRIVER ----------------
+_run_ids = itertools.count()
+
+
+def run_monte_carlo(closes, model="gbm", n_paths=10_000, steps=75,
+                    confidence=0.95, seed=None, chunk_paths=CHUNK_PATHS,
+                    scheduler=None):
+    # closes: historical prices to calibrate on (e.g. cached OHLCV closes)
+    # scheduler: a training.TrainingScheduler to spread chunks over its
+    #   process pool; chunks run in-process when None.
+    if model not in GENERATORS:
+        raise ValueError(f"Unknown model: {model}")
+    if steps < 2:
+        # Per-path volatility needs at least two step returns
+        raise ValueError("Need a horizon of at least two steps")
+
+    closes = np.asarray(closes, dtype=float)
+    start_price = float(closes[-1])
+    params = estimate_params(closes)
+    if model != "bootstrap":
+        params.pop("log_returns")
+
+    sizes = [chunk_paths] * (n_paths // chunk_paths)
+    if n_paths % chunk_paths:
+        sizes.append(n_paths % chunk_paths)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    edges = band_edges(params, steps)
+
+    jobs = [
+        (model, start_price, steps, size, params, s, edges,
+         SAMPLE_PATHS if i == 0 else 0)
+        for i, (size, s) in enumerate(zip(sizes, seeds))
+    ]
+
+    if scheduler is None or len(jobs) == 1:
+        chunks = [simulate_chunk(*job) for job in jobs]
+    else:
+        run_id = next(_run_ids)
+        futures = [
+            scheduler.submit(("monte-carlo", run_id, i), simulate_chunk, *job)
+            for i, job in enumerate(jobs)
+        ]
+        chunks = [f.result() for f in futures]
+
+    terminal = np.concatenate([c["terminal"] for c in chunks])
+    volatility = np.concatenate([c["volatility"] for c in chunks])
+    histograms = np.sum([c["histograms"] for c in chunks], axis=0)
+    bands = start_price * np.exp(histogram_percentiles(histograms, edges, BANDS))
+    bands[:, 0] = start_price     # every path starts there; skip bin rounding
+
+    returns = terminal / start_price - 1
+    var = -float(np.percentile(returns, (1 - confidence) * 100))
+    tail = returns[returns <= -var]
+    cvar = -float(tail.mean()) if len(tail) else var
+    mean_vol = float(volatility.mean())
+
+    return SimulationResult(
+        model=model,
+        n_paths=n_paths,
+        steps=steps,
+        start_price=start_price,
+        expected_return=float(returns.mean()),
+        var=var,
+        cvar=cvar,
+        confidence=confidence,
+        volatility=mean_vol,
+        risk_index=volatility_risk_index(mean_vol),
+        terminal_prices=dict(zip(BANDS, np.percentile(terminal, BANDS).tolist())),
+        bands=bands,
+        sample_paths=chunks[0]["sample"],
+    )
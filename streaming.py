@@ -0,0 +1,205 @@
+import math
+import time
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+Tick = namedtuple("Tick", ["ts", "price", "volume"])
+
+BAR_FIELDS = ("ts", "open", "high", "low", "close", "volume")
+
+
+# ---------------- TICK SOURCES ----------------
+# A source hands out every tick with a timestamp up to `now` (epoch seconds).
+class SimulatedTickSource:
+    # Random-walk ticks around a starting price, generated lazily against
+    # the wall clock so a page can poll it at any rate.
+
+    def __init__(self, price, tick_seconds=0.25, volatility=0.0005,
+                 start=None, seed=None):
+        self.price = float(price)
+        self.tick_seconds = tick_seconds
+        self.volatility = volatility
+        self.next_ts = time.time() if start is None else start
+        self._rng = np.random.default_rng(seed)
+
+    def read(self, now=None):
+        now = time.time() if now is None else now
+        n = int((now - self.next_ts) // self.tick_seconds) + 1
+        if n <= 0:
+            return []
+
+        steps = self._rng.normal(0.0, self.volatility, n)
+        prices = self.price * np.exp(np.cumsum(steps))
+        volumes = self._rng.integers(1, 100, n)
+        stamps = self.next_ts + self.tick_seconds * np.arange(n)
+
+        self.price = float(prices[-1])
+        self.next_ts = float(stamps[-1]) + self.tick_seconds
+        return [Tick(*t) for t in zip(stamps.tolist(), prices.tolist(), volumes.tolist())]
+
+
+class ReplayTickSource:
+    # Replays a CSV of ts,price,volume rows (ts as epoch seconds or ISO
+    # time), mapping the first tick to the first read and playing back
+    # `speed` times faster than recorded.
+
+    def __init__(self, path, speed=1.0):
+        data = pd.read_csv(path)
+        ts = data["ts"]
+        if not pd.api.types.is_numeric_dtype(ts):
+            ts = pd.to_datetime(ts, utc=True).astype("int64") / 1e9
+
+        self.ts = np.asarray(ts, dtype=float)
+        self.price = data["price"].to_numpy(dtype=float)
+        self.volume = data["volume"].to_numpy(dtype=float) if "volume" in data else np.zeros(len(data))
+        self.speed = speed
+        self._pos = 0
+        self._anchor = None
+
+    def read(self, now=None):
+        now = time.time() if now is None else now
+        if self._anchor is None:
+            self._anchor = now
+
+        horizon = self.ts[0] + (now - self._anchor) * self.speed if len(self.ts) else 0
+        end = int(np.searchsorted(self.ts, horizon, side="right"))
+        ticks = [
+            Tick(*t) for t in zip(
+                self.ts[self._pos:end].tolist(),
+                self.price[self._pos:end].tolist(),
+                self.volume[self._pos:end].tolist()
+            )
+        ]
+        self._pos = max(self._pos, end)
+        return ticks
+
+
+# ---------------- BAR AGGREGATION ----------------
+class BarAggregator:
+    # Folds ticks into fixed-width OHLCV bars kept in a ring buffer of
+    # `capacity` closed bars. Each tick costs O(1); nothing is recomputed
+    # from history. Every closed bar gets a sequence number so readers can
+    # ask only for bars they have not seen.
+
+    def __init__(self, bar_seconds, capacity=500):
+        self.bar_seconds = bar_seconds
+        self.capacity = capacity
+        self._bars = np.zeros((capacity, len(BAR_FIELDS)))
+        self.closed = 0          # bars closed since creation (sequence)
+        self.current = None      # open bar as [ts, open, high, low, close, volume]
+
+    def add(self, tick):
+        # Returns the bar closed by this tick, if any
+        start = math.floor(tick.ts / self.bar_seconds) * self.bar_seconds
+        closed = None
+
+        if self.current is not None and start > self.current[0]:
+            closed = self._close()
+        if self.current is None:
+            self.current = [start, tick.price, tick.price, tick.price, tick.price, 0.0]
+
+        bar = self.current
+        bar[2] = max(bar[2], tick.price)
+        bar[3] = min(bar[3], tick.price)
+        bar[4] = tick.price
+        bar[5] += tick.volume
+        return closed
+
+    def since(self, seq):
+        # Closed bars with sequence >= seq that are still buffered
+        seq = max(seq, self.closed - self.capacity, 0)
+        idx = np.arange(seq, self.closed) % self.capacity
+        return self._bars[idx]
+
+    def frame(self, since=0, include_open=False):
+        rows = self.since(since)
+        if include_open and self.current is not None:
+            rows = np.vstack([rows, self.current])
+        return bars_to_frame(rows)
+
+    def _close(self):
+        bar = np.array(self.current)
+        self._bars[self.closed % self.capacity] = bar
+        self.closed += 1
+        self.current = None
+        return bar
+
+
+def bars_to_frame(rows):
+    rows = np.asarray(rows).reshape(-1, len(BAR_FIELDS))
+    data = pd.DataFrame(rows[:, 1:], columns=["Open", "High", "Low", "Close", "Volume"])
+    data.index = pd.DatetimeIndex(pd.to_datetime(rows[:, 0], unit="s", utc=True), name="Datetime")
+    return data
+
+
+# ---------------- ROLLING VOLATILITY ----------------
+class RollingVolatility:
+    # Sample std of simple returns over the last `window` closes, the
+    # streaming equivalent of close.pct_change().std() on the same window.
+    # Welford's update with removal keeps each step O(1).
+
+    def __init__(self, window):
+        self.window = window
+        self._returns = np.zeros(window)
+        self._n = 0
+        self._pos = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._last = None
+
+    def add(self, close):
+        if self._last is not None and self._last != 0:
+            self._push(close / self._last - 1)
+        self._last = close
+
+    @property
+    def value(self):
+        if self._n < 2:
+            return float("nan")
+        return math.sqrt(max(self._m2, 0.0) / (self._n - 1))
+
+    def _push(self, r):
+        if self._n == self.window:
+            old = self._returns[self._pos]
+            mean = self._mean + (r - old) / self._n
+            self._m2 += (r - old) * (r - mean + old - self._mean)
+            self._mean = mean
+        else:
+            self._n += 1
+            delta = r - self._mean
+            self._mean += delta / self._n
+            self._m2 += delta * (r - self._mean)
+
+        self._returns[self._pos] = r
+        self._pos = (self._pos + 1) % self.window
+
+
+# ---------------- TICK STREAM ----------------
+class TickStream:
+    # Source -> bars -> volatility. Call pump() as often as you like; it
+    # returns only the bars closed since the previous call.
+
+    def __init__(self, source, bar_seconds=5, capacity=500, vol_window=None):
+        self.source = source
+        self.bars = BarAggregator(bar_seconds, capacity)
+        self.volatility = RollingVolatility(vol_window or capacity)
+        self.ticks = 0
+        self.last_price = None
+
+    def seed(self, closes):
+        # Warm the volatility window from historical closes
+        for close in closes:
+            self.volatility.add(float(close))
+
+    def pump(self, now=None):
+        closed = []
+        for tick in self.source.read(now):
+            self.ticks += 1
+            self.last_price = tick.price
+            bar = self.bars.add(tick)
+            if bar is not None:
+                closed.append(bar)
+                self.volatility.add(bar[4])
+        return bars_to_frame(closed)
@@ -0,0 +1,151 @@
+import os
+import sys
+import types
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# ---------------- TRAINING SETTINGS ----------------
+# Fits never use more than this many cores, leaving the rest for serving
+# Streamlit reruns. Override with ARTHA_TRAINING_WORKERS.
+MAX_TRAINING_WORKERS = int(
+    os.environ.get("ARTHA_TRAINING_WORKERS", max(1, (os.cpu_count() or 2) // 2))
+)
+TRAINING_NICENESS = 5
+POOL_START_TIMEOUT = 30       # seconds a new worker waits for its siblings
+
+_pool_started = None
+
+
+def _init_worker(started=None):
+    # One BLAS/OpenMP thread per worker so the worker cap is the CPU cap,
+    # and a lower priority so fits yield to the serving process.
+    global _pool_started
+    _pool_started = started
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = "1"
+    try:
+        os.nice(TRAINING_NICENESS)
+    except (AttributeError, OSError):
+        pass
+
+
+# Spawned workers read sys.modules["__main__"] as they start, and every
+# session's script thread reassigns it, so worker start-up is serialised
+# process-wide rather than per scheduler.
+_spawn_lock = threading.Lock()
+
+
+def _await_pool_start():
+    # Keeps a new worker busy (so the pool spawns another for the next job)
+    # until the parent has launched them all
+    if _pool_started is not None:
+        _pool_started.wait(POOL_START_TIMEOUT)
+
+
+@contextmanager
+def _main_module_hidden():
+    # Streamlit executes each page as sys.modules["__main__"], and spawned
+    # workers re-run the main script on startup. Hide it while workers
+    # launch so they import only what the submitted job needs.
+    with _spawn_lock:
+        main = sys.modules.get("__main__")
+        hidden = types.ModuleType("__main__")
+        sys.modules["__main__"] = hidden
+        try:
+            yield
+        finally:
+            # A script run that started meanwhile installed its own module;
+            # putting back the one saved above would clobber it
+            if sys.modules.get("__main__") is hidden:
+                sys.modules["__main__"] = main
+
+
+# ---------------- TRAINING SCHEDULER ----------------
+class TrainingScheduler:
+    # Runs model fits in a process pool so the Streamlit script thread never
+    # blocks on them. Concurrent submissions with the same key share a single
+    # in-flight future.
+
+    def __init__(self, max_workers=MAX_TRAINING_WORKERS):
+        self.max_workers = max_workers
+        self._executor = None
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, fn, *args):
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+
+            future = self._submit(fn, *args)
+            self._inflight[key] = future
+
+        future.add_done_callback(lambda f: self._done(key, f))
+        return future
+
+    def pending(self, key):
+        with self._lock:
+            return key in self._inflight
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def _submit(self, fn, *args, retry=True):
+        # Caller holds the lock
+        if self._executor is None:
+            with _main_module_hidden():
+                self._executor = self._start_pool()
+        try:
+            return self._executor.submit(fn, *args)
+        except BrokenProcessPool:
+            if not retry:
+                raise
+            # A worker died (e.g. OOM); replace the pool and retry once
+            broken, self._executor = self._executor, None
+            broken.shutdown(wait=False, cancel_futures=True)
+            return self._submit(fn, *args, retry=False)
+
+    def _start_pool(self):
+        # Caller holds _spawn_lock with __main__ hidden. Launches every
+        # worker now, so later submits never spawn and never need the swap.
+        context = multiprocessing.get_context("spawn")
+        started = context.Event()
+        executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            # spawn: forking a process that runs Streamlit and the
+            # database writer thread could copy held locks
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(started,)
+        )
+        # A submit spawns a worker unless one is idle, and none can go idle
+        # before `started` is set
+        for _ in range(self.max_workers):
+            executor.submit(_await_pool_start)
+        started.set()
+        return executor
+
+    def _done(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = TrainingScheduler()
+    return _scheduler